@@ -39,10 +39,14 @@ from webauthn2.util import context_from_environment
 from collections import OrderedDict
 
 from .exception import *
+from . import sanepg2
+from . import respcache
+from . import modelcache
+from .compression import compression
 
 from .registry import get_registry
 from .catalog import get_catalog_factory
-from .util import negotiated_content_type, urlquote, random_name
+from .util import negotiated_content_type, urlquote, random_name, PhaseTimer, intern_roles
 
 __all__ = [
     'web_urls',
@@ -62,6 +66,22 @@ global_env = webauthn2.merge_config(
         }
     )
 
+# setup database connection pool limits
+sanepg2.pools.configure(global_env.get('connection_pool', {}))
+
+# setup SQL statement correlation and slow query logging
+sanepg2.statements.configure(global_env.get('slow_query_log', {}))
+
+# setup data response cache limits
+respcache.cache.configure(global_env.get('response_cache', {}))
+
+# setup model cache limits and snapshot directory
+modelcache.cache.configure(global_env.get('model_cache', {}))
+modelcache.snapshots.configure(global_env.get('model_snapshots', {}))
+
+# setup data response compression codecs
+compression.configure(global_env.get('response_compression', {}))
+
 # setup webauthn2 handler
 webauthn2_manager = webauthn2.Manager()
 
@@ -191,6 +211,8 @@ def request_init():
     """Initialize web.ctx with request-specific timers and state used by our REST API layer."""
     web.ctx.ermrest_request_guid = random_name()
     web.ctx.ermrest_start_time = datetime.datetime.now(pytz.timezone('UTC'))
+    web.ctx.ermrest_request_timer = PhaseTimer()
+    web.ctx.ermrest_sql_statements = [] if sanepg2.statements.enabled() else None
     web.ctx.ermrest_request_content_range = None
     web.ctx.ermrest_content_type = None
     web.ctx.webauthn2_manager = webauthn2_manager
@@ -200,8 +222,11 @@ def request_init():
     web.ctx.ermrest_catalog_factory = catalog_factory
     web.ctx.ermrest_config = global_env
     web.ctx.ermrest_catalog_pc = None
+    web.ctx.ermrest_catalog_model = None
+    web.ctx.ermrest_response_cache = None
     web.ctx.ermrest_change_notify = amqp_notifier.notify if amqp_notifier else lambda : None
-    web.ctx.ermrest_model_rights_cache = dict()
+    # (model, shared cache, request-local cache) see model.misc.cache_rights
+    web.ctx.ermrest_model_rights_cache = (None, None, dict())
 
     try:
         # get client authentication context
@@ -228,6 +253,7 @@ def request_init():
         r['id'] if type(r) is dict else r
         for r in web.ctx.webauthn2_context.attributes
     ]).union({'*'})
+    web.ctx.ermrest_client_roles_key = intern_roles(web.ctx.ermrest_client_roles)
 
 def request_final():
     """Log final request handler state to finalize a request's audit trail."""
@@ -254,6 +280,7 @@ def request_final():
     od = OrderedDict([
         (k, v) for k, v in [
             ('elapsed', parts['elapsed']),
+            ('phases', web.ctx.ermrest_request_timer.milliseconds()),
             ('req', parts['reqid']),
             ('scheme', web.ctx.protocol),
             ('host', web.ctx.host),
@@ -262,6 +289,8 @@ def request_final():
             ('path', web.ctx.env['REQUEST_URI']),
             ('range', web.ctx.ermrest_request_content_range),
             ('type', web.ctx.ermrest_content_type),
+            ('cache', web.ctx.ermrest_response_cache),
+            ('slow_sql', sanepg2.statements.slow_statements(web.ctx.ermrest_sql_statements)),
             ('client', parts['client_ip']),
             ('user', parts['client_identity_obj']),
             ('referrer', web.ctx.env.get('HTTP_REFERER')),
@@ -332,6 +361,8 @@ def web_method():
                             raise rest.ServiceUnavailable('Resources unavailable.')
                         elif e.pgcode[0:2] == '40':
                             raise rest.ServiceUnavailable('Transaction aborted.')
+                        elif e.pgcode == '57014':
+                            raise rest.BadRequest('Query run time limit exceeded.')
                         elif e.pgcode[0:2] == '54':
                             raise rest.BadRequest('Program limit exceeded: %s.' % e.message.decode('utf8').strip())
                         elif e.pgcode[0:2] == 'XX':
@@ -26,9 +26,12 @@ This module provides catalog management features including:
 import web
 import psycopg2
 import sanepg2
+import modelcache
+import itertools
+import random
 
-from util import sql_identifier, sql_literal, schema_exists, table_exists, random_name
-from .model import introspect, current_model_version
+from util import sql_identifier, sql_literal, schema_exists, table_exists, random_name, request_phase
+from .model import introspect, build_model, current_model_version, create_model_change_log, UpgradeRequired
 from .model.misc import annotatable_classes, hasacls_classes, hasdynacls_classes
 
 __all__ = ['get_catalog_factory']
@@ -174,7 +177,10 @@ class Catalog (object):
     _DATA_VERSION_TABLE_NAME = 'data_version'
 
     # key cache by (str(descriptor), version)
-    MODEL_CACHE = dict()
+    MODEL_CACHE = modelcache.cache
+
+    # shared rotation for round_robin replica policy
+    _replica_counter = itertools.count()
 
     def __init__(self, factory, descriptor, config=None):
         """Initializes the catalog.
@@ -189,11 +195,20 @@ class Catalog (object):
            
            Right now, this class uses lazy initialization. Thus it does not
            open a connection until required.
+
+           The optional descriptor 'replicas' list names hot-standby
+           databases for read-only access.  Each entry is either a
+           dictionary of connection parameters overriding those of
+           the primary descriptor or a complete libpq DSN string.
         """
         assert factory is not None
         assert descriptor is not None
         self.descriptor = descriptor
         self.dsn = self._serialize_descriptor(descriptor)
+        self.replica_dsns = [
+            replica if isinstance(replica, basestring) else self._serialize_descriptor(dict(descriptor, **replica))
+            for replica in descriptor.get('replicas', [])
+        ]
         self._factory = factory
         self._config = config  # Not sure we need to tuck away the config
 
@@ -204,7 +219,7 @@ class Catalog (object):
            form follows the libpq format.
         """
         if 'type' not in descriptor or descriptor['type'] == self._POSTGRES_REGISTRY:
-            return " ".join([ "%s=%s" % (key, descriptor[key]) for key in descriptor if key != 'type' ])
+            return " ".join([ "%s=%s" % (key, descriptor[key]) for key in descriptor if key not in ('type', 'replicas') ])
         else:
             raise KeyError("Catalog descriptor type not supported: %(type)s" % descriptor)
 
@@ -214,23 +229,91 @@ SELECT txid_current();
 """ % dict(table=self._MODEL_VERSION_TABLE_NAME))
         return cur.next()[0] 
 
-    def get_model(self, cur=None, config=None, private=False):
+    def choose_replica(self, policy=None):
+        """Choose one of self.replica_dsns according to load-balancing policy.
+
+           Supported policies:
+             'round_robin': rotate through replicas (default)
+             'random': choose uniformly at random
+             'least_busy': choose replica with fewest connections in use by this process
+        """
+        if policy == 'random':
+            return random.choice(self.replica_dsns)
+        elif policy == 'least_busy':
+            return min(self.replica_dsns, key=sanepg2.pools.busy)
+        else:
+            return self.replica_dsns[next(self._replica_counter) % len(self.replica_dsns)]
+
+    def get_model(self, cur=None, config=None, private=False, version=None, readonly=False):
+        """Return cached or newly introspected model.
+
+           The version, if provided, must be the current_model_version()
+           already determined in the same transaction, e.g. by a request
+           preamble, to save a round trip.
+
+           With readonly=True, introspection is limited to what is
+           possible in a READ ONLY transaction and may raise
+           UpgradeRequired.
+
+           Unless the "incremental_introspection" config is false, a
+           cache miss only re-reads the schemas and tables changed
+           since the latest model introspected for this catalog.
+
+           When model snapshots are enabled, a process without a model
+           of this catalog starts from the newest saved snapshot, and
+           models introspected in READ ONLY transactions are saved.
+
+           Concurrent cache misses for the same model version wait for
+           one shared introspection, see ModelCache.single_flight().
+        """
         if cur is None:
             cur = web.ctx.ermrest_catalog_pc.cur
         if config is None:
             config = self._config
-        cache_key = (str(self.descriptor), current_model_version(cur))
-        model = self.MODEL_CACHE.get(cache_key)
-        if (model is None) or private:
-            model = introspect(cur, config)
+        if version is None:
+            version = current_model_version(cur)
+        catalog_key = str(self.descriptor)
+        if private:
+            with request_phase('model'):
+                return self._introspect_model(cur, config, version, readonly, private)
+        model = self.MODEL_CACHE.get(catalog_key, version)
+        if model is None:
+            # a READ ONLY leader's UpgradeRequired does not apply to read-write waiters
+            retry_errors = (psycopg2.Error,) if readonly else (psycopg2.Error, UpgradeRequired)
+            with request_phase('model'):
+                model = self.MODEL_CACHE.single_flight(
+                    catalog_key,
+                    version,
+                    lambda : self._introspect_model(cur, config, version, readonly, private),
+                    retry_errors
+                )
+        return model
 
-            if private:
-                assert self.MODEL_CACHE.get(cache_key) != model
-            
-            if not private:
-                self.MODEL_CACHE[cache_key] = model
+    def _introspect_model(self, cur, config, version, readonly, private):
+        """Return model introspected or built from a snapshot, caching it unless private."""
+        catalog_key = str(self.descriptor)
+        # offline callers such as ermrest-freetext-indices pass config outside any request
+        env = config if config is not None else web.ctx.ermrest_config
+        incremental = env.get('incremental_introspection', True)
+        snapshots = modelcache.snapshots.enabled()
+        retain = (incremental or snapshots) and not private
+        base = self.MODEL_CACHE.latest(catalog_key)
+        if base is None and snapshots:
+            base = modelcache.snapshots.load(catalog_key)
+        if isinstance(base, modelcache.ModelSnapshot) and base.version == version and not private:
+            # mutations still introspect so catalog upgrades are applied
+            model = build_model(version, base.introspection_rows, config, retain=retain)
+        else:
+            model = introspect(cur, config, readonly=readonly, base=base if incremental else None, retain=retain)
+            if snapshots and readonly and not private:
+                # READ ONLY transactions cannot hold uncommitted model changes
+                modelcache.snapshots.save(catalog_key, model)
+        if not private:
+            if not incremental:
+                model.introspection_rows = None
+            self.MODEL_CACHE.put(catalog_key, model)
         return model
-    
+
     def destroy(self):
         """Destroys the catalog (i.e., drops the database).
         
@@ -438,6 +521,9 @@ SELECT _ermrest.model_change_event() ;
 
 """ % dict(table=self._MODEL_VERSION_TABLE_NAME)
             )
+
+        if not table_exists(cur, '_ermrest', 'model_change'):
+            create_model_change_log(cur)
             
         if not table_exists(cur, '_ermrest', self._DATA_VERSION_TABLE_NAME):
             cur.execute("""
@@ -0,0 +1,112 @@
+
+#
+# Copyright 2026 University of Southern California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Content-Encoding negotiation and incremental response compression.
+
+The zstd codec is only offered when the optional zstandard module is
+installed.
+
+"""
+
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+class ResponseCompression (object):
+    """Negotiate and apply response content-encoding codecs.
+
+       The defaults may be overridden with configure() using a
+       "response_compression" configuration block.
+    """
+    def __init__(self):
+        self.configure(dict())
+
+    def supported(self):
+        """Return set of codecs available in this service process."""
+        codecs = set(['gzip'])
+        if zstandard is not None:
+            codecs.add('zstd')
+        return codecs
+
+    def configure(self, config):
+        """Apply "response_compression" configuration settings.
+
+           Recognized keys with their defaults:
+
+             "codecs": []        preferred codecs in order, e.g. ["zstd", "gzip"]
+             "gzip_level": 6     zlib compression level 1-9
+             "zstd_level": 3     zstd compression level 1-22
+
+           Unavailable codecs are ignored.
+        """
+        supported = self.supported()
+        self.codecs = [ c for c in config.get('codecs', []) if c in supported ]
+        self.gzip_level = int(config.get('gzip_level', 6))
+        self.zstd_level = int(config.get('zstd_level', 3))
+
+    def enabled(self):
+        return len(self.codecs) > 0
+
+    def negotiate(self, accept_encoding):
+        """Return codec to use for Accept-Encoding header value or None for identity."""
+        if not self.codecs or not accept_encoding:
+            return None
+
+        qvalues = dict()
+        for part in accept_encoding.split(','):
+            fields = part.strip().split(';')
+            coding = fields[0].strip().lower()
+            if not coding:
+                continue
+            q = 1.0
+            for param in fields[1:]:
+                name, sep, value = param.strip().partition('=')
+                if name.strip().lower() == 'q':
+                    try:
+                        q = float(value)
+                    except ValueError:
+                        q = 0.0
+            qvalues[coding] = q
+
+        best = None
+        for codec in self.codecs:
+            q = qvalues.get(codec, qvalues.get('*', 0.0))
+            if q > 0 and (best is None or q > best[1]):
+                best = (codec, q)
+        return best[0] if best else None
+
+    def encode(self, codec, chunks):
+        """Generate compressed chunks of codec stream from uncompressed chunks."""
+        if codec == 'gzip':
+            compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif codec == 'zstd':
+            compressor = zstandard.ZstdCompressor(level=self.zstd_level).compressobj()
+        else:
+            raise NotImplementedError('content-encoding %s' % codec)
+
+        for chunk in chunks:
+            if isinstance(chunk, unicode):
+                chunk = chunk.encode('utf8')
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+compression = ResponseCompression()
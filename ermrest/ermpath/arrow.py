@@ -0,0 +1,200 @@
+
+#
+# Copyright 2026 University of Southern California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Apache Arrow IPC stream serialization of data path results.
+
+This output format is only offered when a supported version of the
+optional pyarrow module is installed.  Releases 0.15 and 0.16 are the
+last to support Python 2.7 with the types and stream writer used
+here.
+
+"""
+
+import json
+import pytz
+
+from ..model.type import Type, ArrayType
+
+# supported pyarrow releases, [min, max)
+PYARROW_VERSIONS = ((0, 15), (0, 17))
+
+def _version(v):
+    try:
+        return tuple([ int(x) for x in v.split('.')[0:2] ])
+    except ValueError:
+        return None
+
+try:
+    import pyarrow as pa
+    if not (PYARROW_VERSIONS[0] <= _version(pa.__version__) < PYARROW_VERSIONS[1]):
+        pa = None
+except ImportError:
+    pa = None
+
+content_type = 'application/vnd.apache.arrow.stream'
+
+# rows per record batch unless configured otherwise
+DEFAULT_BATCH_ROWS = 10000
+
+def available():
+    """Return True if Arrow output can be produced."""
+    return pa is not None
+
+def _text(v):
+    if isinstance(v, str):
+        return v.decode('utf8')
+    return unicode(v)
+
+def _json(v):
+    return json.dumps(v)
+
+def _utc(v):
+    # pyarrow before 2.0 stores the wall-clock fields of aware datetimes
+    return v.astimezone(pytz.utc).replace(tzinfo=None)
+
+_scalar_types = {
+    # ERMrest basic storage type name -> (arrow type factory, value converter or None)
+    'boolean':     (lambda : pa.bool_(), None),
+    'bool':        (lambda : pa.bool_(), None),
+    'int2':        (lambda : pa.int16(), None),
+    'int4':        (lambda : pa.int32(), None),
+    'int8':        (lambda : pa.int64(), None),
+    'float4':      (lambda : pa.float32(), None),
+    'float8':      (lambda : pa.float64(), None),
+    'date':        (lambda : pa.date32(), None),
+    'timestamp':   (lambda : pa.timestamp('us'), None),
+    'timestamptz': (lambda : pa.timestamp('us', tz='UTC'), _utc),
+    'time':        (lambda : pa.time64('us'), None),
+    'interval':    (lambda : pa.duration('us'), None),
+    'json':        (lambda : pa.string(), _json),
+    'jsonb':       (lambda : pa.string(), _json),
+}
+
+def arrow_type(etype):
+    """Return (arrow type, converter) for ERMrest type.
+
+       The converter is None when psycopg2 values can be used
+       directly, otherwise a function to map each non-NULL value.
+       Types without a native Arrow equivalent, e.g. numeric or
+       uuid, are represented as their text form.
+    """
+    if etype.is_array:
+        btype, bconv = arrow_type(etype.base_type)
+        if bconv is None:
+            conv = None
+        else:
+            conv = lambda v: [ bconv(x) if x is not None else None for x in v ]
+        return pa.list_(btype), conv
+
+    typname = etype.sql(basic_storage=True)
+    if typname in _scalar_types:
+        factory, conv = _scalar_types[typname]
+        return factory(), conv
+    return pa.string(), _text
+
+def result_types(conn, description):
+    """Return list of ERMrest types for columns of cursor description."""
+    oids = set([ col.type_code for col in description ])
+    if not oids:
+        return []
+    cur = conn.cursor()
+    cur.execute("""
+SELECT t.oid, t.typname, e.typname
+FROM pg_catalog.pg_type t
+LEFT OUTER JOIN pg_catalog.pg_type e ON (t.typelem = e.oid AND t.typcategory = 'A')
+WHERE t.oid IN (%s)
+""" % ', '.join([ '%d' % oid for oid in oids ]))
+    types = dict()
+    for oid, typname, elemname in cur:
+        if elemname is not None:
+            types[oid] = ArrayType(base_type=Type(typename=elemname))
+        else:
+            types[oid] = Type(typename=typname)
+    cur.close()
+    return [ types.get(col.type_code, Type(typename='text')) for col in description ]
+
+class _Sink (object):
+    """Minimal writable file collecting IPC stream bytes between drains."""
+    closed = False
+
+    def __init__(self):
+        self._buf = []
+        self._pos = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self._buf.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = ''.join(self._buf)
+        self._buf = []
+        return data
+
+def make_arrow_thunk(conn, cur, batch_rows=None, close_cursor=False):
+    """Return thunk generating Arrow IPC stream chunks from cursor.
+
+       Rows are fetched batch_rows at a time and each batch is
+       yielded as one encoded record batch, so memory use is bounded
+       by the batch size rather than the result size.
+
+       If close_cursor is True, close cur after the last row.
+    """
+    if batch_rows is None:
+        batch_rows = DEFAULT_BATCH_ROWS
+
+    def arrow_thunk():
+        rows = cur.fetchmany(batch_rows)
+        # named cursor description is only available after first fetch
+        names = [ col.name for col in cur.description ]
+        types = [ arrow_type(t) for t in result_types(conn, cur.description) ]
+        schema = pa.schema([ pa.field(name, atype) for name, (atype, conv) in zip(names, types) ])
+
+        sink = _Sink()
+        writer = pa.RecordBatchStreamWriter(sink, schema)
+        yield sink.drain()
+
+        while rows:
+            columns = []
+            for i in range(len(names)):
+                atype, conv = types[i]
+                if conv is None:
+                    values = [ row[i] for row in rows ]
+                else:
+                    values = [ conv(row[i]) if row[i] is not None else None for row in rows ]
+                columns.append(pa.array(values, type=atype))
+            writer.write_batch(pa.RecordBatch.from_arrays(columns, names))
+            yield sink.drain()
+            rows = cur.fetchmany(batch_rows)
+
+        writer.close()
+        yield sink.drain()
+
+        if close_cursor:
+            cur.close()
+
+    return arrow_thunk
@@ -22,17 +22,113 @@ navigating, and manipulating data in an ERMREST catalog.
 """
 import psycopg2
 import urllib
+import re
 import csv
 import web
 import json
+import itertools
+import tempfile
 
 from psycopg2._json import JSON_OID, JSONB_OID
 
 from ..exception import *
 from ..util import sql_identifier, sql_literal, random_name
+from .. import sanepg2
+from . import arrow
 from ..model import text_type, int8_type, jsonb_type
+from ..model.key import Unique
+
+# target size of text chunks yielded by row thunks
+ROW_CHUNK_SIZE = 64 * 1024
+
+def chunked(lines, chunk_size=ROW_CHUNK_SIZE):
+    """Regroup iterable of text lines into chunks of approximately chunk_size."""
+    buf = []
+    size = 0
+    for line in lines:
+        buf.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield ''.join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield ''.join(buf)
+
+def spool_chunks(chunks, chunk_size=ROW_CHUNK_SIZE):
+    """Write text chunks to a temporary file now and return generator reading them back.
+
+       The file is closed when the generator is exhausted or closed.
+    """
+    f = tempfile.TemporaryFile()
+    try:
+        for chunk in chunks:
+            f.write(chunk)
+        f.seek(0)
+    except:
+        f.close()
+        raise
+    def reader():
+        try:
+            while True:
+                buf = f.read(chunk_size)
+                if not buf:
+                    break
+                yield buf
+        finally:
+            f.close()
+    return reader()
+
+def range_serializer(content_type, header=None):
+    """Return serialize(cur, i) function for sanepg2.ParallelExport ranges of content_type.
+
+       CSV ranges are rows of the query while other ranges are rows
+       of one JSON text column.  The CSV header line, if any, starts
+       range 0 even when it has no rows.
+    """
+    def serialize(cur, i):
+        if content_type == 'text/csv':
+            lines = ( row_to_csv(row, cur.description) + '\n' for row in cur )
+            if i == 0 and header is not None:
+                lines = itertools.chain([ header ], lines)
+        elif content_type == 'application/json':
+            # separators between ranges are added by concat_ranges()
+            lines = ( (',\n' if j else '') + row[0] for j, row in enumerate(cur) )
+        else:
+            lines = ( row[0] + '\n' for row in cur )
+        return chunked(lines)
+    return serialize
+
+def concat_ranges(content_type, ranges):
+    """Generate output of content_type from iterable of range chunk iterables in order.
+
+       JSON ranges are framed as one array, skipping separators for
+       empty ranges.
+    """
+    if content_type == 'application/json':
+        yield '['
+    sep = ''
+    for chunks in ranges:
+        first = True
+        for chunk in chunks:
+            if first:
+                chunk = sep + chunk
+                if content_type == 'application/json':
+                    sep = ',\n'
+                first = False
+            yield chunk
+    if content_type == 'application/json':
+        yield ']\n'
+
+def make_row_thunk(conn, cur, content_type, drop_tables=[], close_cursor=False):
+    """Return thunk generating serialized rows from cursor.
+
+       For 'application/json', each row must hold one JSON object
+       text and the thunk frames them as one JSON array.  Text
+       content is yielded in chunks of approximately ROW_CHUNK_SIZE.
 
-def make_row_thunk(conn, cur, content_type, drop_tables=[], ):
+       If close_cursor is True, close cur after the last row.
+    """
     def row_thunk():
         """Allow caller to lazily expand cursor after commit.
 
@@ -51,7 +147,15 @@ def make_row_thunk(conn, cur, content_type, drop_tables=[], ):
                     hdr = False
                 yield row_to_csv(row, cur.description) + '\n'
 
-        elif content_type in [ 'application/json', 'application/x-json-stream' ]:
+        elif content_type == 'application/json':
+            yield '['
+            sep = ''
+            for row in cur:
+                yield sep + row[0]
+                sep = ',\n'
+            yield ']\n'
+
+        elif content_type == 'application/x-json-stream':
             for row in cur:
                 yield row[0] + '\n'
 
@@ -66,10 +170,16 @@ def make_row_thunk(conn, cur, content_type, drop_tables=[], ):
         for table in drop_tables:
             cur.execute("DROP TABLE %s" % sql_identifier(table))
 
+        if close_cursor:
+            cur.close()
+
         #if conn is not None:
         #    conn.commit()
-        
-    return row_thunk
+
+    if content_type in [ 'text/csv', 'application/json', 'application/x-json-stream' ]:
+        return lambda : chunked(row_thunk())
+    else:
+        return row_thunk
 
 def notify_data_change(cur, table):
     """Update data version information after possible change to table.
@@ -92,7 +202,7 @@ def notify_data_change(cur, table):
     for table in tables:
         cur.execute('SELECT _ermrest.data_change_event(%s, %s)' % (sql_literal(table.schema.name), sql_literal(table.name)))
 
-def page_filter_sql(keynames, descendings, types, boundary, is_before):
+def page_filter_sql(keynames, descendings, types, boundary, is_before, nullables=None):
     """Return SQL WHERE clause to filter by page boundary.
 
        Keycols, descendings, types, boundary are arrays of length N
@@ -112,50 +222,85 @@ def page_filter_sql(keynames, descendings, types, boundary, is_before):
        is_before: True for '@before(boundary)', False for
          '@after(boundary)'.
 
+       nullables: False for each column known to never be NULL in
+         the result set, or None if all columns may be NULL.
+
+       Runs of adjacent key columns with the same sort direction,
+       known non-NULL values, and non-NULL boundary values are
+       compared as row values, e.g. (a, b) > (1, 2), which Postgres
+       can satisfy with an index range scan.  Other columns are
+       compared one at a time, accounting for DESC NULLS FIRST and
+       ASC NULLS LAST sort orders.
+
     """
     assert len(keynames) == len(descendings)
     assert len(keynames) == len(boundary)
-    
-    def helper(keynames, descendings, types, boundary):
-        # cover non-null/non-null total orderings
-        term = '%(field)s %(op)s %(boundary)s' % {
-            'field': sql_identifier(keynames[0]),
-            'op': { # (descending, is_before)
-                (True,  True):  '>', # field is before boundary descending
-                (True,  False): '<', # field is after boundary descending
-                (False, True):  '<', # field is before boundary ascending
-                (False, False): '>', # field is after boundary ascending
-            }[(descendings[0], is_before)],
-            'boundary': boundary[0].sql_literal(types[0]) if not boundary[0].is_null() else 'NULL',
-        }
-
-        # cover mixed null/non-null total orderings
-        nulltests = { # (nullbound, descending, is_before)
-            (True,  True,  False): 'IS NOT NULL', # field is after null boundary descending
-            (False, True,  True):  'IS NULL',     # field is before non-null boundary descending
-            (True,  False, True):  'IS NOT NULL', # field is before null boundary ascending
-            (False, False, False): 'IS NULL',     # field is after non-null boundary ascending
-        }
-        ntestkey = (boundary[0].is_null(), descendings[0], is_before)
-        if ntestkey in nulltests:
-            term += ' OR %(field)s %(ntest)s' % {
-                'field': sql_identifier(keynames[0]),
-                'ntest': nulltests[ntestkey],
+    if nullables is None:
+        nullables = [ True for k in keynames ]
+
+    ops = { # (descending, is_before)
+        (True,  True):  '>', # field is before boundary descending
+        (True,  False): '<', # field is after boundary descending
+        (False, True):  '<', # field is before boundary ascending
+        (False, False): '>', # field is after boundary ascending
+    }
+
+    def literal(i):
+        return boundary[i].sql_literal(types[i]) if not boundary[i].is_null() else 'NULL'
+
+    def run_length(i):
+        # length of row-value comparable run starting at position i
+        n = 0
+        while i + n < len(keynames) \
+              and not nullables[i + n] \
+              and not boundary[i + n].is_null() \
+              and descendings[i + n] == descendings[i]:
+            n += 1
+        return n
+
+    def helper(i):
+        n = run_length(i)
+        if n > 1:
+            # cover non-null/non-null total orderings with one row-value comparison
+            field = '(%s)' % ', '.join([ sql_identifier(keynames[j]) for j in range(i, i + n) ])
+            value = '(%s)' % ', '.join([ literal(j) for j in range(i, i + n) ])
+            term = '%s %s %s' % (field, ops[(descendings[i], is_before)], value)
+            equal = '%s = %s' % (field, value)
+        else:
+            n = 1
+            # cover non-null/non-null total orderings
+            term = '%(field)s %(op)s %(boundary)s' % {
+                'field': sql_identifier(keynames[i]),
+                'op': ops[(descendings[i], is_before)],
+                'boundary': literal(i),
             }
 
-        if len(keynames) == 1:
+            # cover mixed null/non-null total orderings
+            nulltests = { # (nullbound, descending, is_before)
+                (True,  True,  False): 'IS NOT NULL', # field is after null boundary descending
+                (False, True,  True):  'IS NULL',     # field is before non-null boundary descending
+                (True,  False, True):  'IS NOT NULL', # field is before null boundary ascending
+                (False, False, False): 'IS NULL',     # field is after non-null boundary ascending
+            }
+            ntestkey = (boundary[i].is_null(), descendings[i], is_before)
+            if ntestkey in nulltests and (nullables[i] or nulltests[ntestkey] == 'IS NOT NULL'):
+                term += ' OR %(field)s %(ntest)s' % {
+                    'field': sql_identifier(keynames[i]),
+                    'ntest': nulltests[ntestkey],
+                }
+
+            if nullables[i] or boundary[i].is_null():
+                equal = '%s IS NOT DISTINCT FROM %s' % (sql_identifier(keynames[i]), literal(i))
+            else:
+                equal = '%s = %s' % (sql_identifier(keynames[i]), literal(i))
+
+        if i + n == len(keynames):
             return term
         else:
-            # if row field matches boundary, check secondary sort order
-            return '(%s) OR (%s IS NOT DISTINCT FROM %s AND (%s))' % (
-                term,
-                sql_identifier(keynames[0]),
-                boundary[0].sql_literal(types[0]) if not boundary[0].is_null() else 'NULL',
-                helper(keynames[1:], descendings[1:], types[1:], boundary[1:])
-            )
+            # if row fields match boundary, check secondary sort order
+            return '(%s) OR (%s AND (%s))' % (term, equal, helper(i + n))
 
-    result = helper(keynames, descendings, types, boundary)
-    return result
+    return helper(0)
 
 
 def sort_components(sortvec, is_before):
@@ -269,7 +414,7 @@ class EntityElem (object):
         """
         return [ f.sql_where(self.epath, self, prefix=prefix) for f in self.filters ]
 
-    def sql_table_elem(self, dynauthz=None, access_type='select', prefix='', dynauthz_testcol=None):
+    def sql_table_elem(self, dynauthz=None, access_type='select', prefix='', dynauthz_testcol=None, columns=None):
         """Generate SQL table element representing this entity as part of the epath JOIN.
 
            dynauthz: dynamic authorization mode to compile
@@ -281,9 +426,11 @@ class EntityElem (object):
                None: normal mode
                col: match rows where client is NOT authorized to access column
 
+           columns: set of column names needed by the query or None for all
+
         """
         alias = '%st%d' % (prefix, self.pos)
-        tsql = self.table.sql_name(dynauthz=dynauthz, access_type=access_type, alias=alias, dynauthz_testcol=dynauthz_testcol)
+        tsql = self.table.sql_name(dynauthz=dynauthz, access_type=access_type, alias=alias, dynauthz_testcol=dynauthz_testcol, columns=columns)
         if self.pos == 0:
             return tsql
         else:
@@ -682,10 +829,8 @@ FROM (
             if content_type == 'text/csv':
                 # TODO implement and use row_to_csv() stored procedure?
                 pass
-            elif content_type == 'application/json':
-                sql = "WITH q AS (%s) SELECT COALESCE(array_to_json(array_agg(row_to_json(q.*)), True)::text, '[]') FROM q" % sql
-            elif content_type == 'application/x-json-stream':
-                sql = "WITH q AS (%s) SELECT row_to_json(q.*)::text FROM q" % sql
+            elif content_type in [ 'application/json', 'application/x-json-stream' ]:
+                sql = "SELECT row_to_json(q.*)::text FROM (%s) q" % sql
             elif content_type in [ dict, tuple ]:
                 pass
             else:
@@ -693,10 +838,21 @@ FROM (
             #web.debug(sql)
             return sql
 
-        # NOTE: we already prefetch the whole result so might as well build incrementally...
-        results = []
+        # collect returned rows in output table to stream them after the modifications
+        output_table = random_name("output_data_")
+        output_created = []
+
+        def capture_output(sql, shape_sql):
+            """Run data-modifying sql and append its RETURNING rows to output table shaped like shape_sql."""
+            if not output_created:
+                # ON COMMIT DROP runs after held cursors are materialized
+                cur.execute("CREATE TEMPORARY TABLE %s ON COMMIT DROP AS %s WITH NO DATA" % (
+                    sql_identifier(output_table),
+                    shape_sql
+                ))
+                output_created.append(True)
+            cur.execute("WITH q AS (%s) INSERT INTO %s SELECT * FROM q" % (sql, sql_identifier(output_table)))
 
-        # we cannot use a held cursor here because upsert_sql modifies the DB
         try:
             notify_data_change(cur, self.table)
 
@@ -782,18 +938,19 @@ LIMIT 1""") % dict(
                             if cur.rowcount > 0:
                                 raise Forbidden(u'update access on foreign key reference %s' % fkr)
 
-                    cur.execute(
-                        preserialize(("""
+                    capture_output(
+                        ("""
 UPDATE %(table)s t SET %(assigns)s FROM (
   SELECT %(icols)s FROM %(input_table)s i
 ) i
 WHERE %(keymatches)s
-RETURNING %(tcols)s""") % parts
-                        )
+RETURNING %(tcols)s""") % parts,
+                        ("""
+SELECT %(tcols)s FROM %(table)s t, (
+  SELECT %(icols)s FROM %(input_table)s i
+) i""") % parts
                     )
 
-                    results.extend(make_row_thunk(None, cur, content_type)())
-
                 if allow_missing is None:
                     raise NotImplementedError("EntityElem.put allow_existing=%s allow_missing=%s" % (allow_existing, allow_missing))
             else:
@@ -860,8 +1017,8 @@ LIMIT 1""") % dict(
                     ),
                     tcols = ','.join([ jsonfix2(c.sql_name(), c) for c in (mkcols + nmkcols) ])
                 )
-                cur.execute(
-                    preserialize(("""
+                capture_output(
+                    ("""
 INSERT INTO %(table)s (%(cols)s)
 SELECT * FROM (
   SELECT %(icols)s FROM %(input_table)s i
@@ -870,35 +1027,32 @@ SELECT * FROM (
     SELECT %(emkcols)s FROM %(input_table)s e
     EXCEPT SELECT %(mkcols)s FROM %(table)s e
   ) t ON (%(keymatches)s)""" if use_defaults is None else ""
-) + ") i RETURNING %(tcols)s") % parts
-                    )
+) + ") i RETURNING %(tcols)s") % parts,
+                    "SELECT %(tcols)s FROM %(table)s" % parts
                 )
 
-                new_results = list(make_row_thunk(None, cur, content_type)())
-                
-                if content_type == 'application/json':
-                    if not results:
-                        pass
-                    elif results == ['[]\n']:
-                        results = []
-                    elif new_results == ['[]\n']:
-                        new_results = []
-                    else:
-                        # we need to splice together two serialized JSON arrays...
-                        assert results[-1][-2:] == ']\n'
-                        assert new_results[0][0] == '['
-                        results[-1] = results[-1][:-2] # remote closing ']\n'
-                        results.append(',\n') # add separator
-                        new_results[0] = new_results[0][1:] # remove opening '['
-
-                results.extend(new_results)
-
             for table in drop_tables:
                 cur.execute("DROP TABLE %s" % sql_identifier(table))
         except psycopg2.IntegrityError, e:
             raise ConflictModel('Input data violates model. ' + e.pgerror)
-            
-        return results
+
+        if not output_created:
+            return []
+
+        # held cursor lets caller stream results after commit
+        rows = make_row_thunk(
+            None,
+            conn.execute(preserialize("SELECT * FROM %s" % sql_identifier(output_table))),
+            content_type,
+            close_cursor=True
+        )()
+        if conn.transaction_pooling:
+            # cannot hold cursor past commit via transaction-mode pooler
+            if content_type in [ dict, tuple ]:
+                rows = list(rows)
+            else:
+                rows = spool_chunks(rows)
+        return rows
 
 class AnyPath (object):
     """Hierarchical ERM access to resources, a generic parent-class for concrete resources.
@@ -922,6 +1076,7 @@ class AnyPath (object):
         raise NotImplementedError('sql_get on abstract class ermpath.AnyPath')
 
     def _get_sort_element(self, key):
+        """Return (keyname, descending, type, nullable) for sort key."""
         raise NotImplementedError()
 
     def _get_sortvec(self):
@@ -936,13 +1091,13 @@ class AnyPath (object):
 
     def _get_page_sql(self, sortvec, output_type_overrides={}):
         if sortvec is not None:
-            a, b, c = zip(*sortvec)
+            a, b, c, d = zip(*sortvec)
             if self.after is not None:
-                page = 'WHERE (%s)' % page_filter_sql(a, b, c, self.after, is_before=False)
+                page = 'WHERE (%s)' % page_filter_sql(a, b, c, self.after, is_before=False, nullables=d)
                 if self.before is not None:
-                    page = '%s AND (%s)' % (page, page_filter_sql(a, b, c, self.before, is_before=True))
+                    page = '%s AND (%s)' % (page, page_filter_sql(a, b, c, self.before, is_before=True, nullables=d))
             elif self.before is not None:
-                page = 'WHERE (%s)' % page_filter_sql(a, b, c, self.before, is_before=True)
+                page = 'WHERE (%s)' % page_filter_sql(a, b, c, self.before, is_before=True, nullables=d)
             else:
                 page = ''
         return page
@@ -999,6 +1154,31 @@ class AnyPath (object):
 
         return aggregates, extras, output_type_overrides
 
+    def _enforce_base_select(self):
+        # we defer base entity enforcement to allow insert-only use cases
+        if hasattr(self, '_path'):
+            # EntityPath
+            self._path[0].table.enforce_right('select')
+        elif hasattr(self, 'epath'):
+            self.epath._path[0].table.enforce_right('select')
+
+    def explain(self, cur, content_type='application/json', limit=None, analyze=False):
+        """Return (sql, plan) for the query get() would run.
+
+           The plan is the parsed EXPLAIN (FORMAT JSON) result, which
+           also includes run-time statistics and buffer usage if
+           analyze is True.  Note that analyze executes the query.
+        """
+        self._enforce_base_select()
+        sql = self.sql_get(row_content_type=content_type, limit=limit, dynauthz=True)
+        if content_type in [ 'application/json', 'application/x-json-stream' ]:
+            sql = "SELECT row_to_json(q.*)::text FROM (%s) q" % sql
+        cur.execute("EXPLAIN (%sFORMAT JSON) %s" % ('ANALYZE, BUFFERS, ' if analyze else '', sql))
+        plan = next(cur)[0]
+        if isinstance(plan, basestring):
+            plan = json.loads(plan)
+        return sql, plan
+
     def get(self, conn, cur, content_type='text/csv', output_file=None, limit=None):
         """Fetch resources.
 
@@ -1009,6 +1189,7 @@ class AnyPath (object):
                 'text/csv' --> CSV table with header row
                 'application/json' --> JSON array of row objects
                 'application/x-json-stream' --> stream of JSON objects
+                'application/vnd.apache.arrow.stream' --> Arrow IPC stream of record batches
 
               Python types select native Python result formats
                 dict  --> dict of column:value per row
@@ -1019,19 +1200,14 @@ class AnyPath (object):
 
            output_file: 
               None --> thunk result, when invoked generates iterable results
+              sanepg2.CopyOutStream --> start streaming the serialized output
               x --> x.write() the serialized output
 
            Note: only text content types are supported with
            output_file writing.
         """
 
-        # we defer base entity enforcement to allow insert-only use cases
-        if hasattr(self, '_path'):
-            # EntityPath
-            self._path[0].table.enforce_right('select')
-        elif hasattr(self, 'epath'):
-            self.epath._path[0].table.enforce_right('select')
-
+        self._enforce_base_select()
         sql = self.sql_get(row_content_type=content_type, limit=limit, dynauthz=True)
 
         #web.debug(sql)
@@ -1047,7 +1223,10 @@ class AnyPath (object):
             else:
                 raise NotImplementedError('content_type %s with output_file.write()' % content_type)
 
-            cur.copy_expert(sql, output_file)
+            if isinstance(output_file, sanepg2.CopyOutStream):
+                output_file.start(cur, sql)
+            else:
+                cur.copy_expert(sql, output_file)
 
             return output_file
 
@@ -1056,18 +1235,22 @@ class AnyPath (object):
             if content_type == 'text/csv':
                 # TODO implement and use row_to_csv() stored procedure?
                 pass
-            elif content_type == 'application/json':
-                sql = "SELECT array_to_json(COALESCE(array_agg(row_to_json(q.*)), ARRAY[]::json[]), True)::text FROM (%s) q" % sql
-            elif content_type == 'application/x-json-stream':
+            elif content_type in [ 'application/json', 'application/x-json-stream' ]:
                 sql = "SELECT row_to_json(q.*)::text FROM (%s) q" % sql
             elif content_type in [ dict, tuple ]:
                 pass
+            elif content_type == arrow.content_type and arrow.available():
+                return arrow.make_arrow_thunk(
+                    conn,
+                    conn.execute(sql),
+                    web.ctx.ermrest_config.get('arrow_batch_rows'),
+                    close_cursor=True
+                )()
             else:
                 raise NotImplementedError('content_type %s' % content_type)
 
-            cur.execute(sql)
-            
-            return make_row_thunk(None, cur, content_type)()
+            # server-side cursor streams rows in batches instead of prefetching the whole result
+            return make_row_thunk(None, conn.execute(sql), content_type, close_cursor=True)()
 
 class EntityPath (AnyPath):
     """Hierarchical ERM data access to whole entities, i.e. table rows.
@@ -1125,6 +1308,20 @@ class EntityPath (AnyPath):
         """Change path entity context to existing context referenced by alias."""
         self._context_index = self.aliases[alias]
 
+    def statically_authorized(self, access_type='select'):
+        """Return True if no dynamic ACLs affect access to tables in entity path.
+
+           Results of such paths depend only on the client roles, the
+           model, and the data of the path tables.
+        """
+        for elem in self._path:
+            if elem.table.has_right(access_type) is not True:
+                return False
+            for col in elem.table.columns_in_order():
+                if col.has_right(access_type) is None:
+                    return False
+        return True
+
     def get_data_version(self, cur):
         """Get data version txid considering all tables in entity path."""
         preds = [
@@ -1147,6 +1344,141 @@ WHERE %(pred)s
         version = next(cur)
         return version
 
+    def _parallel_export_key(self, content_type, limit):
+        """Return key column for parallel export of this path or None.
+
+           Only unlimited, unsorted exports of one statically
+           authorized base table with a single-column non-null key
+           are split into key ranges.
+        """
+        if limit is not None \
+           or content_type not in [ 'text/csv', 'application/json', 'application/x-json-stream' ] \
+           or len(self._path) != 1 \
+           or self.sort is not None \
+           or not self.statically_authorized():
+            return None
+        table = self._path[0].table
+        if table.kind != 'r':
+            return None
+        for unique in table.uniques.values():
+            if isinstance(unique, Unique) \
+               and len(unique.columns) == 1 \
+               and unique.is_primary_key() \
+               and unique.has_right('select'):
+                return list(unique.columns)[0]
+        return None
+
+    def _parallel_export_bounds(self, cur, keycol, nranges):
+        """Return sorted SQL literals splitting keycol into about nranges ranges of similar size."""
+        table = keycol.table
+        cur.execute("""
+SELECT b::text
+FROM (
+  SELECT unnest(histogram_bounds::text::%(type)s[]) AS b
+  FROM pg_catalog.pg_stats
+  WHERE schemaname = %(schema)s AND tablename = %(table)s AND attname = %(column)s
+) s ;
+""" % dict(
+    type=keycol.type.sql(basic_storage=True),
+    schema=sql_literal(table.schema.name),
+    table=sql_literal(table.name),
+    column=sql_literal(keycol.name),
+)
+        )
+        bounds = [ row[0] for row in cur ]
+        if len(bounds) < 3:
+            return []
+        # histogram bounds divide the column into buckets of equal population
+        splits = []
+        for i in range(1, nranges):
+            b = bounds[i * (len(bounds) - 1) // nranges]
+            if not splits or splits[-1] != b:
+                splits.append(b)
+        return [ keycol.type.sql_literal(keycol.type.url_parse(b)) for b in splits ]
+
+    def _parallel_export(self, conn, cur, content_type, limit):
+        """Return started sanepg2.ParallelExport for large exports or None to run one query."""
+        config = web.ctx.ermrest_config.get('parallel_export', {})
+        nworkers = int(config.get('workers', 0))
+        if nworkers < 2:
+            return None
+        keycol = self._parallel_export_key(content_type, limit)
+        if keycol is None:
+            return None
+
+        table = self._path[0].table
+        cur.execute("SELECT reltuples FROM pg_catalog.pg_class WHERE oid = %s::regclass ;" % sql_literal(table.sql_name()))
+        if next(cur)[0] < int(config.get('min_rows', 1000000)):
+            return None
+
+        splits = self._parallel_export_bounds(cur, keycol, int(config.get('ranges_per_worker', 4)) * nworkers)
+        if not splits:
+            return None
+
+        # try to share our snapshot, which is not possible e.g. on some hot standby servers
+        cur.execute("SAVEPOINT parallel_export ;")
+        try:
+            cur.execute("SELECT pg_export_snapshot() ;")
+            snapshot = next(cur)[0]
+        except psycopg2.Error, e:
+            cur.execute("ROLLBACK TO SAVEPOINT parallel_export ;")
+            web.debug('ERMrest parallel export unavailable: %s' % e)
+            return None
+        cur.execute("RELEASE SAVEPOINT parallel_export ;")
+
+        kname = sql_identifier(keycol.name)
+        preds = [ '%s < %s' % (kname, splits[0]) ] + [
+            '%s >= %s AND %s < %s' % (kname, splits[i], kname, splits[i+1])
+            for i in range(len(splits) - 1)
+        ] + [ '%s >= %s' % (kname, splits[-1]) ]
+
+        sql = self.sql_get(row_content_type=content_type, dynauthz=True)
+        header = None
+        if content_type == 'text/csv':
+            sql = "SELECT s.* FROM (%s) s WHERE %%s ORDER BY s.%s" % (sql, kname)
+            # header names the output columns as COPY ... CSV HEADER would
+            cur.execute("%s LIMIT 0 ;" % (sql % 'False'))
+            header = row_to_csv([ d[0] for d in cur.description ]) + '\n'
+        else:
+            sql = "SELECT row_to_json(s.*)::text FROM (%s) s WHERE %%s ORDER BY s.%s" % (sql, kname)
+
+        # workers get the same time limit as our own statements
+        cur.execute("SELECT setting::int8 FROM pg_catalog.pg_settings WHERE name = 'statement_timeout' ;")
+        timeout = next(cur)[0]
+
+        export = sanepg2.ParallelExport(
+            web.ctx.ermrest_catalog_pc.used_pool.dsn,
+            snapshot,
+            [ sql % pred for pred in preds ],
+            range_serializer(content_type, header),
+            statement_timeout=timeout
+        )
+        try:
+            export.start(conn, nworkers)
+        except psycopg2.pool.PoolError:
+            return None
+        return export
+
+    def get(self, conn, cur, content_type='text/csv', output_file=None, limit=None):
+        """Fetch entities, see AnyPath.get().
+
+           Unlimited exports of large tables may be split into key
+           ranges fetched concurrently on several connections under
+           one shared snapshot and concatenated in key order, if
+           enabled by the "parallel_export" configuration.
+        """
+        self._path[0].table.enforce_right('select')
+        export = self._parallel_export(conn, cur, content_type, limit)
+        if export is None:
+            return AnyPath.get(self, conn, cur, content_type=content_type, output_file=output_file, limit=limit)
+
+        if output_file is None or isinstance(output_file, sanepg2.CopyOutStream):
+            # stream ranges instead of running COPY
+            return concat_ranges(content_type, export.ranges())
+        for chunk in concat_ranges(content_type, export.ranges()):
+            output_file.write(chunk)
+        return output_file
+
     def add_filter(self, filt, enforce_client=True):
         """Add a filter condition to the current path.
 
@@ -1217,7 +1549,10 @@ WHERE %(pred)s
         table = self.current_entity_table()
         column = table.columns.get_enumerable(key.keyname)
         # select access was already enforced for enumerable output columns
-        return (key.keyname, key.descending, column.type)
+        nullable = column.nullok \
+                   or (column.has_right('select') is None and column.dynauthz_restricted('select')) \
+                   or any([ elem.outer_type for elem in self._path ])
+        return (key.keyname, key.descending, column.type, nullable)
 
     def sql_get(self, selects=None, distinct_on=True, row_content_type='application/json', limit=None, dynauthz=None, access_type='select', prefix='', enforce_client=True, dynauthz_testcol=None):
         """Generate SQL query to get the entities described by this epath.
@@ -1234,10 +1569,27 @@ WHERE %(pred)s
            
            encoding path references and filter conditions.
 
+           When the context is the last element of an inner-joined
+           path and whole entities with a non-null key are
+           requested, the earlier elements can only filter the
+           context rows, and the query will instead be of the form:
+
+              SELECT
+                tK.*
+              FROM "z" AS tK
+              WHERE EXISTS (
+                SELECT 1 FROM "x" AS t0 ... WHERE ...
+              )
+
+           which needs no DISTINCT ON and lets sort and limit apply
+           directly to the context table.
+
         """
         context_table = self._path[self._context_index].table
         context_pos = self.current_entity_position()
 
+        semijoin = self._semijoin_ok(context_pos, selects, distinct_on, enforce_client)
+
         if selects is None:
             # non-enumerable columns will be omitted from entity results
             for col in context_table.columns_in_order():
@@ -1272,24 +1624,29 @@ WHERE %(pred)s
             for c in shortest_pkey
         ]
 
+        if semijoin:
+            return self._sql_get_semijoin(selects, context_pos, limit, dynauthz, access_type, prefix, dynauthz_testcol)
+
+        wheres = []
+        for elem in self._path:
+            wheres.extend( elem.sql_wheres(prefix=prefix) )
+
+        if len(self._path) == 1:
+            distinct_on = False
+
+        columns = self._needed_columns(prefix, [ selects ] + wheres + (distinct_on and distinct_on_cols or []))
+
         tables = [
-            elem.sql_table_elem(dynauthz=dynauthz, access_type=access_type, prefix=prefix)
+            elem.sql_table_elem(dynauthz=dynauthz, access_type=access_type, prefix=prefix, columns=columns[elem.pos])
             for elem in self._path[0:context_pos]
         ] + [
             # dynauthz_testcol may be None or an actual column here...
-            self._path[context_pos].sql_table_elem(dynauthz=dynauthz, access_type=access_type, prefix=prefix, dynauthz_testcol=dynauthz_testcol)
+            self._path[context_pos].sql_table_elem(dynauthz=dynauthz, access_type=access_type, prefix=prefix, dynauthz_testcol=dynauthz_testcol, columns=columns[context_pos])
         ] + [
             # this is usually empty list but might not if a URL path ends with a context reset
-            elem.sql_table_elem(dynauthz=dynauthz, access_type=access_type, prefix=prefix)
+            elem.sql_table_elem(dynauthz=dynauthz, access_type=access_type, prefix=prefix, columns=columns[elem.pos])
             for elem in self._path[context_pos+1:]
         ]
-
-        wheres = []
-        for elem in self._path:
-            wheres.extend( elem.sql_wheres(prefix=prefix) )
-
-        if len(self._path) == 1:
-            distinct_on = False
             
         sql = """
 SELECT 
@@ -1318,6 +1675,113 @@ FROM %(tables)s
 
         return sql
 
+    def _needed_columns(self, prefix, fragments):
+        """Return list of column name sets needed from each path element.
+
+           The SQL fragments of the query outside the path table
+           elements are searched for references to each element
+           alias.  Join conditions are always included.  An element
+           referenced as a whole row, e.g. "t1.*", needs all columns
+           and gets None instead of a set.
+
+           This lets dynamic ACL subqueries project only the needed
+           columns instead of compiling column policies for every
+           column of wide tables.
+        """
+        fragments = list(fragments) + [
+            elem.sql_join_condition(prefix)
+            for elem in self._path[1:]
+        ]
+        text = u' '.join(fragments)
+        columns = []
+        for elem in self._path:
+            alias = re.escape('%st%d' % (prefix, elem.pos))
+            if re.search(r'(?<![\w".])%s(?![\w"]|\.")' % alias, text):
+                # whole-row or unrecognized reference
+                columns.append(None)
+                continue
+            columns.append(set([
+                m.group(1).replace(u'""', u'"')
+                for m in re.finditer(r'(?<![\w".])%s\."((?:[^"]|"")*)"' % alias, text)
+            ]))
+        return columns
+
+    def _semijoin_ok(self, context_pos, selects, distinct_on, enforce_client):
+        """Return True if entity query can use a semi-join instead of DISTINCT ON.
+
+           Requires that:
+             - whole context entities are selected (no custom selects)
+             - the context is the last of several path elements
+             - all joins are inner joins
+             - the context table is a base table with an enforced key
+               of non-null columns, so its rows are already distinct
+        """
+        if selects is not None or not distinct_on:
+            return False
+        if len(self._path) == 1 or context_pos != len(self._path) - 1:
+            return False
+        if any([ elem.outer_type is not None for elem in self._path ]):
+            return False
+        table = self._path[context_pos].table
+        if table.kind != 'r':
+            return False
+        for unique in table.uniques.values():
+            if isinstance(unique, Unique) \
+               and (unique.has_right('select') or not enforce_client) \
+               and not any([ c.nullok for c in unique.columns ]):
+                return True
+        return False
+
+    def _sql_get_semijoin(self, selects, context_pos, limit, dynauthz, access_type, prefix, dynauthz_testcol):
+        """Generate semi-join form of entity query (see sql_get)."""
+        celem = self._path[context_pos]
+        # filters on any element may refer to the context element as an outer reference
+        wheres = [ celem.sql_join_condition(prefix) ]
+        for elem in self._path:
+            wheres.extend( elem.sql_wheres(prefix=prefix) )
+        columns = self._needed_columns(prefix, wheres)
+        tables = [
+            elem.sql_table_elem(dynauthz=dynauthz, access_type=access_type, prefix=prefix, columns=columns[elem.pos])
+            for elem in self._path[0:context_pos]
+        ]
+
+        sortvec, sort1, sort2 = self._get_sortvec()
+        limit = 'LIMIT %d' % limit if limit is not None else ''
+        if sort1 is not None:
+            # page and sort keys are unqualified context table column names
+            page = self._get_page_sql(sortvec)
+            page = page and (' AND %s' % page[len('WHERE '):])
+            order = 'ORDER BY %s' % sort1
+        else:
+            page = ''
+            order = ''
+
+        sql = """
+SELECT
+  %(selects)s
+FROM %(ctable)s
+WHERE EXISTS (
+  SELECT 1
+  FROM %(tables)s
+  WHERE %(where)s
+)%(page)s
+%(order)s %(limit)s
+""" % dict(selects = selects,
+           ctable  = celem.table.sql_name(dynauthz=dynauthz, access_type=access_type, alias='%st%d' % (prefix, context_pos), dynauthz_testcol=dynauthz_testcol),
+           tables  = ' '.join(tables),
+           where   = ' AND '.join(['(%s)' % w for w in wheres]),
+           page    = page,
+           order   = order,
+           limit   = limit
+           )
+
+        if sort2 is not None:
+            if not limit:
+                raise BadSyntax('Page @before(...) modifier not allowed without limit parameter.')
+            sql = "SELECT * FROM (%s) s ORDER BY %s" % (sql, sort2)
+
+        return sql
+
     def sql_delete(self):
         """Generate SQL statement to delete the entities described by this epath.
         """
@@ -1448,7 +1912,7 @@ class AttributePath (AnyPath):
     def _get_sort_element(self, key):
         if key.keyname not in self.outputs:
             raise BadData('Sort key "%s" not among output columns.' % key.keyname)
-        return (key.keyname, key.descending, self.output_types[key.keyname])
+        return (key.keyname, key.descending, self.output_types[key.keyname], True)
 
     def sql_get(self, split_sort=False, distinct_on=True, row_content_type='application/json', limit=None, dynauthz=None, access_type='select', prefix='', enforce_client=True):
         """Generate SQL query to get the resources described by this apath.
@@ -1697,7 +2161,7 @@ class AttributeGroupPath (AnyPath):
             otype = self.apath.output_types[key.keyname]
         else:
             raise BadData('Sort key "%s" not among output columns.' % key.keyname)
-        return (key.keyname, key.descending, otype)
+        return (key.keyname, key.descending, otype, True)
 
     def sql_get(self, row_content_type='application/json', limit=None, dynauthz=None, access_type='select', prefix='', enforce_client=True):
         """Generate SQL query to get the resources described by this apath.
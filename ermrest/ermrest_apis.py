@@ -75,7 +75,7 @@ from .exception import *
 
 from .registry import get_registry
 from .catalog import get_catalog_factory
-from .util import urlquote
+from .util import urlquote, request_phase
 
 # expose webauthn REST APIs
 webauthn2_handler_factory = webauthn2.RestHandlerFactory(manager=webauthn2_manager)
@@ -110,7 +110,8 @@ class Dispatcher (object):
         uri = web.ctx.env['REQUEST_URI']
         
         try:
-            return uri, url_parse_func(uri)
+            with request_phase('parse'):
+                return uri, url_parse_func(uri)
         except (LexicalError, ParseError), te:
             raise rest.BadRequest(str(te))
         except rest.WebException, te:
@@ -28,9 +28,9 @@ from .type import Type, text_type, tsvector_type, int8_type, jsonb_type
 from .column import Column
 from .table import Table
 from .schema import Model, Schema
-from .introspect import introspect, current_model_version
+from .introspect import introspect, build_model, current_model_version, current_model_version_sql, create_model_change_log, UpgradeRequired
 from . import name
 from . import predicate
 
-__all__ = ["introspect", "current_model_version", "Model", "Schema", "Table", "Column", "Type", "name", "predicate"]
+__all__ = ["introspect", "build_model", "current_model_version", "current_model_version_sql", "create_model_change_log", "UpgradeRequired", "Model", "Schema", "Table", "Column", "Type", "name", "predicate"]
 
@@ -297,6 +297,9 @@ class FreetextColumn (Column):
        as a document, sorted by column order.
     """
     
+    # instances are made per request, so keep decisions out of shared cache
+    shared_rights = False
+
     def __init__(self, table):
         Column.__init__(self, '*', None, tsvector_type, None)
 
@@ -27,27 +27,201 @@ needed by other modules of the ermrest project.
 import web
 
 from .. import exception
-from ..util import table_exists, view_exists, column_exists
-from .misc import frozendict, annotatable_classes, hasacls_classes, hasdynacls_classes
+from ..util import sql_identifier, sql_literal, table_exists, view_exists, column_exists
+from .misc import frozendict, annotatable_classes, hasacls_classes, hasdynacls_classes, storage_sql
 from .schema import Model, Schema
 from .type import build_type, text_type
 from .column import Column
 from .table import Table
 from .key import Unique, ForeignKey, KeyReference, PseudoUnique, PseudoKeyReference
 
+def current_model_version_sql():
+    """Return SQL scalar expression for the model version visible to the current snapshot."""
+    return "(SELECT max(snap_txid) FROM _ermrest.model_version WHERE snap_txid < txid_snapshot_xmin(txid_current_snapshot()))"
+
 def current_model_version(cur):
     cur.execute("""
-SELECT max(snap_txid) AS txid FROM _ermrest.model_version WHERE snap_txid < txid_snapshot_xmin(txid_current_snapshot()) ;
-""")
+SELECT %s AS txid ;
+""" % current_model_version_sql())
     return cur.next()[0]
 
-def introspect(cur, config=None):
+class UpgradeRequired (RuntimeError):
+    """Catalog needs upgrades which cannot be applied during read-only introspection."""
+    pass
+
+# incremental introspection falls back to a full pass beyond this many changed schemas and tables
+INCREMENTAL_SCOPE_LIMIT = 1000
+
+def create_model_change_log(cur):
+    """Create or upgrade the _ermrest.model_change log of changed model resources.
+
+       Each row records a schema and table changed by the transaction
+       snap_txid.  A NULL table means the whole schema changed and a
+       NULL schema means the whole model changed, e.g. for the
+       legacy _ermrest.model_change_event() without arguments.
+    """
+    cur.execute("""
+CREATE TABLE _ermrest.model_change (
+    snap_txid bigint NOT NULL,
+    "schema" text,
+    "table" text
+);
+CREATE INDEX model_change_snap_txid_idx ON _ermrest.model_change (snap_txid);
+
+CREATE OR REPLACE FUNCTION _ermrest.model_change_event(sname text, tname text) RETURNS void AS $$
+DECLARE
+
+  trigger_txid bigint;
+
+BEGIN
+
+  SELECT txid_current() INTO trigger_txid;
+
+  IF NOT EXISTS (SELECT snap_txid FROM _ermrest.model_version WHERE snap_txid = trigger_txid) THEN
+    INSERT INTO _ermrest.model_version (snap_txid) SELECT trigger_txid ;
+  END IF;
+
+  IF NOT EXISTS (SELECT snap_txid
+                 FROM _ermrest.model_change c
+                 WHERE c.snap_txid = trigger_txid
+                   AND c."schema" IS NOT DISTINCT FROM sname
+                   AND c."table" IS NOT DISTINCT FROM tname) THEN
+    INSERT INTO _ermrest.model_change (snap_txid, "schema", "table") SELECT trigger_txid, sname, tname ;
+  END IF;
+
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION _ermrest.model_change_event() RETURNS void AS $$
+BEGIN
+  PERFORM _ermrest.model_change_event(NULL::text, NULL::text);
+END;
+$$ LANGUAGE plpgsql;
+""")
+
+class ModelScope (object):
+    """Set of schemas and tables whose introspected catalog rows are stale."""
+
+    def __init__(self):
+        self.schemas = set()
+        self.tables = set()
+
+    def __len__(self):
+        return len(self.schemas) + len(self.tables)
+
+    def sql(self, pairs):
+        """Return SQL boolean expression true for rows in scope.
+
+           pairs: list of (schema column, table column or None)
+             naming resources a row depends on; the row is in scope
+             if any of them is.
+        """
+        clauses = []
+        for scol, tcol in pairs:
+            if self.schemas:
+                clauses.append('%s IN (%s)' % (
+                    sql_identifier(scol),
+                    ', '.join([ sql_literal(sname) for sname in self.schemas ])
+                ))
+            if tcol is not None and self.tables:
+                clauses.append('(%s, %s) IN (%s)' % (
+                    sql_identifier(scol),
+                    sql_identifier(tcol),
+                    ', '.join([ '(%s, %s)' % (sql_literal(sname), sql_literal(tname)) for sname, tname in self.tables ])
+                ))
+        if not pairs:
+            return 'True'
+        return '(%s)' % (' OR '.join(clauses) if clauses else 'False')
+
+    def row_filter(self, names, pairs):
+        """Return function true for rows in scope, given result column names and pairs as for sql()."""
+        positions = [
+            (names.index(scol), names.index(tcol) if tcol is not None else None)
+            for scol, tcol in pairs
+        ]
+        def in_scope(row):
+            if not positions:
+                return True
+            for spos, tpos in positions:
+                if row[spos] in self.schemas:
+                    return True
+                if tpos is not None and (row[spos], row[tpos]) in self.tables:
+                    return True
+            return False
+        return in_scope
+
+def model_change_scope(cur, since, base_rows):
+    """Return ModelScope of changes logged after model version since or None if the whole model may have changed.
+
+       The base_rows of the model at version since must have been read
+       while the change log existed, or earlier changes may be missed.
+    """
+    if since is None or base_rows.get('model_change_log') != [(True,)]:
+        return None
+    if not table_exists(cur, '_ermrest', 'model_change'):
+        return None
+    cur.execute("""
+SELECT DISTINCT "schema", "table" FROM _ermrest.model_change WHERE snap_txid > %s ;
+""" % sql_literal(since))
+    scope = ModelScope()
+    for sname, tname in cur.fetchall():
+        if sname is None:
+            return None
+        elif tname is None:
+            scope.schemas.add(sname)
+        else:
+            scope.tables.add((sname, tname))
+    if len(scope) > INCREMENTAL_SCOPE_LIMIT:
+        return None
+    return scope
+
+def _storage_helpers():
+    """Generate (class, helper method name, storage suffix) for auxilliary model storage."""
+    for classes, method, suffix in [
+            (annotatable_classes, 'introspect_helper', 'annotation'),
+            (hasacls_classes, 'introspect_acl_helper', 'acl'),
+            (hasdynacls_classes, 'introspect_dynacl_helper', 'dynacl'),
+    ]:
+        for klass in classes:
+            if hasattr(klass, method):
+                yield klass, method, suffix
+
+def _storage_pairs(klass):
+    """Return scope pairs for auxilliary storage rows of klass."""
+    keying = klass._model_keying
+    if 'from_schema_name' in keying:
+        return [ ('from_schema_name', 'from_table_name'), ('to_schema_name', 'to_table_name') ]
+    elif 'schema_name' in keying:
+        return [ ('schema_name', 'table_name' if 'table_name' in keying else None) ]
+    else:
+        return []
+
+def _type_doc(doc):
+    """Copy column type doc which build_type() will consume destructively."""
+    return dict([
+        (k, _type_doc(v) if isinstance(v, dict) else v)
+        for k, v in doc.items()
+    ])
+
+def introspect(cur, config=None, readonly=False, base=None, retain=False):
     """Introspects a Catalog (i.e., a database).
     
     This function (currently) does not attempt to catch any database 
     (or other) exceptions.
     
     The 'conn' parameter must be an open connection to a database.
+
+    With readonly=True, introspection is safe in a READ ONLY
+    transaction: healing of missing data_version rows is skipped and
+    UpgradeRequired is raised if the catalog needs upgrades.
+
+    With retain=True, the catalog rows read are kept on the returned
+    model as introspection_rows.  When such a model is passed as
+    base, only rows for schemas and tables logged as changed since
+    base.version are read again and the rest are reused from base,
+    provided the _ermrest.model_change log already existed when the
+    rows of base were read.
+    A new model is always built, so base itself is not modified.
     
     Returns the introspected Model instance.
     """
@@ -95,7 +269,7 @@ FROM (
   SELECT DISTINCT t.table_schema, t.table_name FROM (%s) t
   EXCEPT SELECT "schema", "table" FROM _ermrest.data_version
 ) t
-''' % SELECT_TABLES
+'''
     
     SELECT_COLUMNS = '''
 SELECT
@@ -258,57 +432,116 @@ SELECT
 FROM _ermrest.model_pseudo_keyref ;
 '''
 
-    # PostgreSQL denotes array types with the string 'ARRAY'
-    ARRAY_TYPE = 'ARRAY'
-    
-    # Dicts for quick lookup
-    schemas  = dict()
-    tables   = dict()
-    columns  = dict()
-    pkeys    = dict()
-    fkeys    = dict()
-    fkeyrefs = dict()
-
     cur.execute("""
 SELECT max(snap_txid) AS txid FROM _ermrest.model_version WHERE snap_txid < txid_snapshot_xmin(txid_current_snapshot()) ;
 """
     )
     version = cur.next()[0]
-    
-    model = Model(version)
 
     # upgrade catalogs in the field to support named pseudo keyrefs
     if table_exists(cur, "_ermrest", "model_pseudo_keyref") \
        and not column_exists(cur, "_ermrest", "model_pseudo_keyref", "name"):
+        if readonly:
+            raise UpgradeRequired('_ermrest.model_pseudo_keyref.name')
         web.debug('NOTICE: adding _ermrest.model_psuedo_keyref.name column during model introspection')
         cur.execute('ALTER TABLE _ermrest.model_pseudo_keyref ADD COLUMN "name" text UNIQUE;')
 
     # upgrade catalogs in the field to support named pseudo keys
     if table_exists(cur, "_ermrest", "model_pseudo_key") \
        and not column_exists(cur, "_ermrest", "model_pseudo_key", "name"):
+        if readonly:
+            raise UpgradeRequired('_ermrest.model_pseudo_key.name')
         web.debug('NOTICE: adding _ermrest.model_psuedo_key.name column during model introspection')
         cur.execute('ALTER TABLE _ermrest.model_pseudo_key ADD COLUMN "name" text UNIQUE;')
 
-    cur.execute(HEAL_DATA_VERSIONS);
+    # upgrade catalogs in the field to log scoped model changes
+    # readers simply introspect the whole model until this is done
+    if not readonly and not table_exists(cur, "_ermrest", "model_change"):
+        web.debug('NOTICE: adding _ermrest.model_change table during model introspection')
+        create_model_change_log(cur)
+
+    base_rows = base.introspection_rows if base is not None else None
+    scope = None
+    if base_rows is not None and base.version is not None and version is not None and base.version <= version:
+        scope = model_change_scope(cur, base.version, base_rows)
+
+    def scoped(sql, pairs):
+        if scope is None:
+            return sql
+        return 'SELECT * FROM (%s) s WHERE %s' % (sql.strip().rstrip(';'), scope.sql(pairs))
+
+    table_pairs = [ ('table_schema', 'table_name') ]
+
+    if not readonly:
+        # a missing row only means the table is unchanged since it was tracked,
+        # so readers can leave healing to the next read-write introspection
+        cur.execute(HEAL_DATA_VERSIONS % scoped(SELECT_TABLES, table_pairs))
+
+    # (row set name, query, scope pairs) for each catalog row set
+    queries = [
+        ('schemas', SELECT_SCHEMAS, [ ('schema_name', None) ]),
+        ('columns', SELECT_COLUMNS, table_pairs),
+        ('pseudo_notnull', PSEUDO_NOT_NULL_COLUMNS, [ ('nn_table_schema', 'nn_table_name') ]),
+        ('tables', SELECT_TABLES, table_pairs),
+        ('pkeys', PKEY_COLUMNS, [ ('pk_table_schema', 'pk_table_name') ]),
+        ('pseudo_pkeys', PSEUDO_PKEY_COLUMNS, [ ('pk_table_schema', 'pk_table_name') ]),
+        ('fkeys', FKEY_COLUMNS, [ ('fk_table_schema', 'fk_table_name'), ('uq_table_schema', 'uq_table_name') ]),
+        ('pseudo_fkeys', PSEUDO_FKEY_COLUMNS, [ ('fk_table_schema', 'fk_table_name'), ('uq_table_schema', 'uq_table_name') ]),
+    ] + [
+        ('model_%s_%s' % (klass._model_restype, suffix), storage_sql(klass, suffix), _storage_pairs(klass))
+        for klass, method, suffix in _storage_helpers()
+    ]
+
+    # later introspections may only build on these rows if changes since are logged
+    rows = dict(model_change_log=[(table_exists(cur, "_ermrest", "model_change"),)])
+    for name, sql, pairs in queries:
+        if name in rows:
+            # storage shared by several resource classes
+            continue
+        if scope is None or name not in base_rows:
+            cur.execute(sql)
+            rows[name] = list(cur)
+        else:
+            cur.execute(scoped(sql, pairs))
+            in_scope = scope.row_filter([ d[0] for d in cur.description ], pairs)
+            rows[name] = [ row for row in base_rows[name] if not in_scope(row) ] + list(cur)
+
+    return build_model(version, rows, config, retain)
+
+def build_model(version, rows, config=None, retain=False):
+    """Build a Model from catalog row sets read by introspect().
+
+       With retain=True, rows are kept on the model as for introspect().
+    """
+    # PostgreSQL denotes array types with the string 'ARRAY'
+    ARRAY_TYPE = 'ARRAY'
     
+    # Dicts for quick lookup
+    schemas  = dict()
+    tables   = dict()
+    columns  = dict()
+    pkeys    = dict()
+    fkeys    = dict()
+    fkeyrefs = dict()
+
+    model = Model(version)
+
     #
     # Introspect schemas, tables, columns
     #
     
     # get schemas (including empty ones)
-    cur.execute(SELECT_SCHEMAS);
-    for dname, sname, scomment in cur:
+    for dname, sname, scomment in rows['schemas']:
         if (dname, sname) not in schemas:
             schemas[(dname, sname)] = Schema(model, sname, scomment)
 
     # get columns
-    cur.execute(SELECT_COLUMNS)
-    for dname, sname, tname, tkind, tcomment, cnames, default_values, column_types, notnull, comments in cur:
+    for dname, sname, tname, tkind, tcomment, cnames, default_values, column_types, notnull, comments in rows['columns']:
 
         cols = []
         for i in range(0, len(cnames)):
             # Determine base type
-            base_type = build_type(column_types[i], defaultval=default_values[i], config=config, readonly=True)
+            base_type = build_type(_type_doc(column_types[i]), defaultval=default_values[i], config=config, readonly=True)
                 
             # Translate default_value
             try:
@@ -328,15 +561,13 @@ SELECT max(snap_txid) AS txid FROM _ermrest.model_version WHERE snap_txid < txid
         tables[(dname, sname, tname)] = Table(schemas[(dname, sname)], tname, cols, tkind, tcomment)
 
     # Introspect psuedo not-null constraints
-    cur.execute(PSEUDO_NOT_NULL_COLUMNS)
-    for nn_id, dname, sname, tname, cname in cur:
+    for nn_id, dname, sname, tname, cname in rows['pseudo_notnull']:
         # skip if column is not found due to orphaned psuedo not-null entry...
         if (dname, sname, tname, cname) in columns:
             columns[(dname, sname, tname, cname)].nullok = False
 
     # also get empty tables
-    cur.execute(SELECT_TABLES)
-    for dname, sname, tname, tkind, tcomment in cur:
+    for dname, sname, tname, tkind, tcomment in rows['tables']:
         if (dname, sname) not in schemas:
             schemas[(dname, sname)] = Schema(model, sname)
         if (dname, sname, tname) not in tables:
@@ -364,15 +595,13 @@ SELECT max(snap_txid) AS txid FROM _ermrest.model_version WHERE snap_txid < txid
                 # save at least one comment in case multiple constraints have same key columns
                 pkeys[pk_colset].comment = pk_comment
     
-    cur.execute(PKEY_COLUMNS)
-    for pk_schema, pk_name, pk_table_schema, pk_table_name, pk_column_names, pk_comment in cur:
+    for pk_schema, pk_name, pk_table_schema, pk_table_name, pk_column_names, pk_comment in rows['pkeys']:
         _introspect_pkey(
             pk_table_schema, pk_table_name, pk_column_names, pk_comment,
             lambda pk_colset: Unique(pk_colset, (pk_schema, pk_name), pk_comment)
         )
 
-    cur.execute(PSEUDO_PKEY_COLUMNS)
-    for pk_id, pk_name, pk_table_schema, pk_table_name, pk_column_names, pk_comment in cur:
+    for pk_id, pk_name, pk_table_schema, pk_table_name, pk_column_names, pk_comment in rows['pseudo_pkeys']:
         _introspect_pkey(
             pk_table_schema, pk_table_name, pk_column_names, pk_comment,
             lambda pk_colset: PseudoUnique(pk_colset, pk_id, ("", (pk_name if pk_name is not None else pk_id)), pk_comment)
@@ -416,20 +645,18 @@ SELECT max(snap_txid) AS txid FROM _ermrest.model_version WHERE snap_txid < txid
                 fk.references[fk_ref_map].comment = fk_comment
 
     
-    cur.execute(FKEY_COLUMNS)
     for fk_schema, fk_name, fk_table_schema, fk_table_name, fk_column_names, \
             uq_table_schema, uq_table_name, uq_column_names, on_delete, on_update, fk_comment \
-            in cur:
+            in rows['fkeys']:
         _introspect_fkr(
             fk_table_schema, fk_table_name, fk_column_names,
             uq_table_schema, uq_table_name, uq_column_names, fk_comment,
             lambda fk, pk, fk_ref_map: KeyReference(fk, pk, fk_ref_map, on_delete, on_update, (fk_schema, fk_name), comment=fk_comment)
         )
         
-    cur.execute(PSEUDO_FKEY_COLUMNS)
     for fk_id, fk_constraint_name, fk_table_schema, fk_table_name, fk_column_names, \
             uq_table_schema, uq_table_name, uq_column_names, fk_comment \
-            in cur:
+            in rows['pseudo_fkeys']:
         fk_constraint_name = ("", (fk_constraint_name if fk_constraint_name is not None else fk_id))
         _introspect_fkr(
             fk_table_schema, fk_table_name, fk_column_names,
@@ -438,27 +665,19 @@ SELECT max(snap_txid) AS txid FROM _ermrest.model_version WHERE snap_txid < txid
         )
     
     #
-    # Introspect ERMrest model overlay annotations
+    # Introspect ERMrest model overlay annotations, ACLs, and dynamic ACLs
     #
-    for klass in annotatable_classes:
-        if hasattr(klass, 'introspect_helper'):
-            klass.introspect_helper(cur, model)
-
-    # introspect ERMrest model ACLs
-    for klass in hasacls_classes:
-        if hasattr(klass, 'introspect_acl_helper'):
-            klass.introspect_acl_helper(cur, model)
-
-    # introspect ERMrest model ACLs
-    for klass in hasdynacls_classes:
-        if hasattr(klass, 'introspect_dynacl_helper'):
-            klass.introspect_dynacl_helper(cur, model)
+    for klass, method, suffix in _storage_helpers():
+        getattr(klass, method)(rows['model_%s_%s' % (klass._model_restype, suffix)], model)
 
     # save our private schema in case we want to unhide it later...
     model.ermrest_schema = model.schemas['_ermrest']
     del model.schemas['_ermrest']
 
-    model.check_primary_keys(web.ctx.ermrest_config.get('require_primary_keys', True))
+    env = config if config is not None else web.ctx.ermrest_config
+    model.check_primary_keys(env.get('require_primary_keys', True))
 
+    if retain:
+        model.introspection_rows = rows
     return model
 
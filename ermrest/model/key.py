@@ -16,7 +16,7 @@
 
 from .. import exception
 from ..util import sql_identifier, sql_literal, constraint_exists
-from .misc import frozendict, AltDict, AclDict, DynaclDict, keying, annotatable, commentable, cache_rights, hasacls, hasdynacls, enforce_63byte_id, truncated_identifier
+from .misc import frozendict, AltDict, AclDict, DynaclDict, keying, annotatable, commentable, cache_rights, hasacls, hasdynacls, enforce_63byte_id, truncated_identifier, model_change_event_sql
 from .name import _keyref_join_str, _keyref_join_sql
 
 import web
@@ -67,12 +67,13 @@ class Unique (object):
             pk_schema, pk_name = self.constraint_name
             cur.execute("""
 COMMENT ON CONSTRAINT %s ON %s.%s IS %s;
-SELECT _ermrest.model_change_event();
+%s
 """ % (
     sql_identifier(unicode(pk_name)),
     sql_identifier(unicode(self.table.schema.name)),
     sql_identifier(unicode(self.table.name)),
-    sql_literal(comment)
+    sql_literal(comment),
+    model_change_event_sql(self)
 )
         )
         # also update other constraints sharing same key colset
@@ -245,10 +246,11 @@ class PseudoUnique (object):
 UPDATE _ermrest.model_pseudo_key
 SET comment = %s
 WHERE id = %s ;
-SELECT _ermrest.model_change_event();
+%s
 """ % (
     sql_literal(comment),
-    sql_literal(self.id)
+    sql_literal(self.id),
+    model_change_event_sql(self)
 )
         )
         # also update other constraints sharing same key colset
@@ -288,12 +290,13 @@ SELECT _ermrest.model_change_event();
     def add(self, conn, cur):
         self.table.enforce_right('owner') # since we don't use alter_table which enforces for real keys
         cur.execute("""
-SELECT _ermrest.model_change_event();
+%s
 INSERT INTO _ermrest.model_pseudo_key 
   (schema_name, table_name, column_names, comment, name)
   VALUES (%s, %s, ARRAY[%s], %s, %s) 
   RETURNING id;
 """ % (
+    model_change_event_sql(self),
     sql_literal(unicode(self.table.schema.name)),
     sql_literal(unicode(self.table.name)),
     ','.join([ sql_literal(unicode(c.name)) for c in self.columns ]),
@@ -315,8 +318,8 @@ INSERT INTO _ermrest.model_pseudo_key
         if self.id:
             cur.execute("""
 DELETE FROM _ermrest.model_pseudo_key WHERE id = %s;
-SELECT _ermrest.model_change_event();
-""" % sql_literal(self.id)
+%s
+""" % (sql_literal(self.id), model_change_event_sql(self))
             )
         for pk in self.constraints:
             if pk != self:
@@ -526,12 +529,13 @@ class KeyReference (object):
             fkr_schema, fkr_name = self.constraint_name
             cur.execute("""
 COMMENT ON CONSTRAINT %s ON %s.%s IS %s;
-SELECT _ermrest.model_change_event();
+%s
 """ % (
     sql_identifier(unicode(fkr_name)),
     sql_identifier(unicode(self.foreign_key.table.schema.name)),
     sql_identifier(unicode(self.foreign_key.table.name)),
-    sql_literal(comment)
+    sql_literal(comment),
+    model_change_event_sql(self)
 )
             )
         # also update other constraints sharing same mapping
@@ -758,11 +762,12 @@ class PseudoKeyReference (object):
             cur.execute("""
 UPDATE _ermrest.model_pseudo_keyref
 SET comment = %s
-WHERE id = %s
-SELECT _ermrest.model_change_event();
+WHERE id = %s ;
+%s
 """ % (
     sql_literal(comment),
-    sql_literal(self.id)
+    sql_literal(self.id),
+    model_change_event_sql(self)
 )
             )
         # also update other constraints sharing same mapping
@@ -801,12 +806,13 @@ SELECT _ermrest.model_change_event();
         self.foreign_key.table.enforce_right('owner') # since we don't use alter_table which enforces for real keyrefs
         fk_cols = list(self.foreign_key.columns)
         cur.execute("""
-SELECT _ermrest.model_change_event();
+%s
 INSERT INTO _ermrest.model_pseudo_keyref
   (from_schema_name, from_table_name, from_column_names, to_schema_name, to_table_name, to_column_names, comment, name)
   VALUES (%s, %s, ARRAY[%s], %s, %s, ARRAY[%s], %s, %s)
   RETURNING id
 """ % (
+    model_change_event_sql(self),
     sql_literal(unicode(self.foreign_key.table.schema.name)),
     sql_literal(unicode(self.foreign_key.table.name)),
     ', '.join([ sql_literal(unicode(fk_cols[i].name)) for i in range(len(fk_cols)) ]),
@@ -831,8 +837,8 @@ INSERT INTO _ermrest.model_pseudo_keyref
         if self.id:
             cur.execute("""
 DELETE FROM _ermrest.model_pseudo_keyref WHERE id = %s;
-SELECT _ermrest.model_change_event();
-""" % sql_literal(self.id)
+%s
+""" % (sql_literal(self.id), model_change_event_sql(self))
             )
         for fkr in self.constraints:
             if fkr != self:
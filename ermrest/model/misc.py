@@ -15,7 +15,7 @@
 #
 
 from .. import exception
-from ..util import sql_identifier, sql_literal, table_exists, udecode
+from ..util import sql_identifier, sql_literal, table_exists, udecode, request_phase
 from .. import ermpath
 from .type import _default_config
 from .name import Name
@@ -223,6 +223,8 @@ class AclBinding (AltDict):
         self.model = model
         self.resource = resource
         self.binding_name = binding_name
+        # client-independent SQL compiled by get_dynacl_clauses()
+        self._sql_template = None
 
         # let AltDict validator behavior check each field above for simple stuff...
         for k, v in doc.items():
@@ -243,6 +245,10 @@ class AclBinding (AltDict):
         if 'scope_acl' not in self:
             self['scope_acl'] = ['*']
 
+    def __setitem__(self, k, v):
+        AltDict.__setitem__(self, k, v)
+        self._sql_template = None
+
     def inscope(self, access_type, roles=None):
         """Return True if this ACL binding applies to this access type for this client, False otherwise."""
         if roles is None:
@@ -387,8 +393,8 @@ def commentable(orig_class):
         for resource in resources:
             cur.execute("""
 COMMENT ON %s IS %s;
-SELECT _ermrest.model_change_event();
-""" % (resource, sql_literal(comment))
+%s
+""" % (resource, sql_literal(comment), model_change_event_sql(self))
             )
             self.comment = comment
 
@@ -439,32 +445,38 @@ CREATE TABLE _ermrest.%(tname)s (%(cols)s);
 )
     )
 
-def _introspect_helper(orig_class, cur, model, suffix, extra_keys, extra_cols, func):
-    tname = 'model_%s_%s' % (orig_class._model_restype, suffix)
-    cols = orig_class._model_keying.keys() + extra_keys.keys() + extra_cols.keys()
-    cur.execute("""
-SELECT %(cols)s FROM _ermrest.%(tname)s;
+# extra (keys, columns) of each kind of auxilliary storage table
+_storage_extras = {
+    'annotation': ({'annotation_uri': 'text'}, {'annotation_value': 'json'}),
+    'acl': ({'acl': 'text'}, {'members': 'text[]'}),
+    'dynacl': ({'binding_name': 'text'}, {'binding': 'jsonb'}),
+}
+
+def storage_columns(orig_class, suffix):
+    """Return (keying columns, other columns) of auxilliary storage in a stable order."""
+    extra_keys, extra_cols = _storage_extras[suffix]
+    return (
+        sorted(orig_class._model_keying.keys()),
+        sorted(extra_keys.keys()) + sorted(extra_cols.keys())
+    )
+
+def storage_sql(orig_class, suffix):
+    """Return SQL query for auxilliary storage rows with storage_columns() layout."""
+    kcols, xcols = storage_columns(orig_class, suffix)
+    return """
+SELECT %(cols)s FROM _ermrest.%(tname)s
 """ % dict(
-    tname=tname,
-    cols=', '.join([sql_identifier(c) for c in cols])
+    tname='model_%s_%s' % (orig_class._model_restype, suffix),
+    cols=', '.join([sql_identifier(c) for c in kcols + xcols])
 )
-    )
-    for row in cur:
-        kwargs0 = {
-            cols[i]: row[i]
-            for i in range(
-                    len(orig_class._model_keying.keys())
-            )
-        }
-        kwargs0['model'] = model
 
-        kwargs1 = {
-            cols[i]: row[i]
-            for i in range(
-                    len(orig_class._model_keying.keys()),
-                    len(orig_class._model_keying.keys()) + len(extra_keys.keys()) + len(extra_cols.keys())
-            )
-        }
+def _introspect_helper(orig_class, rows, model, suffix, func):
+    kcols, xcols = storage_columns(orig_class, suffix)
+    nkeys = len(kcols)
+    for row in rows:
+        kwargs0 = dict(zip(kcols, row[0:nkeys]))
+        kwargs0['model'] = model
+        kwargs1 = dict(zip(xcols, row[nkeys:]))
 
         try:
             kwargs1['resource'] = orig_class.keyed_resource(**kwargs0)
@@ -473,14 +485,69 @@ SELECT %(cols)s FROM _ermrest.%(tname)s;
             # TODO: prune orphaned auxilliary storage?
             pass
 
+def model_change_event_sql(resource):
+    """Return SQL statement recording a model change scoped to resource.
+
+       The change is scoped to the table or schema named by the
+       resource keying, so model introspection can refresh just that
+       part of the model.  Catalog-level resources are recorded as a
+       change to the whole model.
+    """
+    keying = resource._model_keying
+    sname = keying.get('schema_name', keying.get('from_schema_name'))
+    tname = keying.get('table_name', keying.get('from_table_name'))
+    return 'SELECT _ermrest.model_change_event(%s::text, %s::text);' % (
+        sql_literal(sname[1](resource)) if sname else 'NULL',
+        sql_literal(tname[1](resource)) if tname else 'NULL',
+    )
+
+def _resource_model(resource):
+    """Return the model containing resource, found via its parent references."""
+    while True:
+        for attr in ('model', 'schema', 'table', 'foreign_key'):
+            parent = getattr(resource, attr, None)
+            if parent is not None:
+                resource = parent
+                break
+        else:
+            return resource
+
+def _request_rights_caches():
+    """Return (model, shared, local) access decision caches for this request.
+
+       The shared cache belongs to the request's model and is reused
+       by later requests with the same client roles.  The local cache
+       holds decisions about other resources, e.g. those of a model
+       being introspected during the request.
+    """
+    model = web.ctx.ermrest_catalog_model
+    bound = web.ctx.ermrest_model_rights_cache
+    if bound[0] is not model:
+        shared = model.rights_cache(web.ctx.ermrest_client_roles_key) if model is not None else None
+        bound = (model, shared, bound[2])
+        web.ctx.ermrest_model_rights_cache = bound
+    return bound
+
 def cache_rights(orig_method):
     def helper(self, aclname, roles=None, anon_mutation_ok=False):
-        key = (self, orig_method, aclname, frozenset(roles) if roles is not None else None, anon_mutation_ok)
-        if key in web.ctx.ermrest_model_rights_cache:
-            result = web.ctx.ermrest_model_rights_cache[key]
+        if roles is None or roles is web.ctx.ermrest_client_roles:
+            # client roles are implied by the cache in use
+            roles_key = None
+        else:
+            roles_key = frozenset(roles)
+        key = (self, orig_method, aclname, roles_key, anon_mutation_ok)
+        model, shared, local = _request_rights_caches()
+        if shared is not None and key in shared:
+            return shared[key]
+        if key in local:
+            return local[key]
+        result = orig_method(self, aclname, roles)
+        if shared is not None \
+           and getattr(self, 'shared_rights', True) \
+           and _resource_model(self) is model:
+            shared[key] = result
         else:
-            result = orig_method(self, aclname, roles)
-            web.ctx.ermrest_model_rights_cache[key] = result
+            local[key] = result
         return result
     return helper
 
@@ -540,13 +607,14 @@ INSERT INTO _ermrest.model_%s_annotation (%s) VALUES %s;
             for k, v in interp.items()
         ])
         cur.execute("""
-SELECT _ermrest.model_change_event();
+%(change)s
 UPDATE _ermrest.model_%(restype)s_annotation new
 SET annotation_value = %(newval)s
 FROM _ermrest.model_%(restype)s_annotation old
 WHERE %(where)s
 RETURNING old.annotation_value;
 """ % dict(
+    change=model_change_event_sql(self),
     restype=orig_class._model_restype,
     newval=sql_literal(json.dumps(value)),
     where=where
@@ -560,9 +628,9 @@ RETURNING old.annotation_value;
         columns = ', '.join([sql_identifier(k) for k in interp.keys()] + ['annotation_value'])
         values = ', '.join([interp[k] for k in interp.keys()] + [sql_literal(json.dumps(value))])
         cur.execute("""
-SELECT _ermrest.model_change_event();
+%s
 INSERT INTO _ermrest.model_%s_annotation (%s) VALUES (%s);
-""" % (orig_class._model_restype, columns, values)
+""" % (model_change_event_sql(self), orig_class._model_restype, columns, values)
         )
         return None
 
@@ -578,9 +646,9 @@ INSERT INTO _ermrest.model_%s_annotation (%s) VALUES (%s);
             for k in keys
         ])
         cur.execute("""
-SELECT _ermrest.model_change_event();
+%s
 DELETE FROM _ermrest.model_%s_annotation %s;
-""" % (orig_class._model_restype, ('WHERE %s' % where) if where else '')
+""" % (model_change_event_sql(self), orig_class._model_restype, ('WHERE %s' % where) if where else '')
         )
 
     @classmethod
@@ -588,10 +656,10 @@ DELETE FROM _ermrest.model_%s_annotation %s;
         _create_storage_table(orig_class, cur, 'annotation', {'annotation_uri': 'text'}, {'annotation_value': 'json'})
 
     @classmethod
-    def introspect_helper(orig_class, cur, model):
+    def introspect_helper(orig_class, rows, model):
         def helper(resource=None, annotation_uri=None, annotation_value=None):
             resource.annotations[annotation_uri] = annotation_value
-        _introspect_helper(orig_class, cur, model, 'annotation', {'annotation_uri': 'text'}, {'annotation_value': 'json'}, helper)
+        _introspect_helper(orig_class, rows, model, 'annotation', helper)
 
     setattr(orig_class, '_interp_annotation', _interp_annotation)
     setattr(orig_class, 'set_annotation', set_annotation)
@@ -629,10 +697,10 @@ def hasacls(acls_supported, rights_supported, getparent):
         _create_storage_table(orig_class, cur, 'acl', {'acl': 'text'}, {'members': 'text[]'})
 
     @classmethod
-    def introspect_acl_helper(orig_class, cur, model):
+    def introspect_acl_helper(orig_class, rows, model):
         def helper(resource=None, acl=None, members=None):
             resource.acls[acl] = members
-        _introspect_helper(orig_class, cur, model, 'acl', {'acl': 'text'}, {'members': 'text[]'}, helper)
+        _introspect_helper(orig_class, rows, model, 'acl', helper)
 
     def set_acl(self, cur, aclname, members, anon_mutation_ok=False):
         """Set annotation on %s, returning previous value for updates or None.""" % self._model_restype
@@ -658,13 +726,14 @@ def hasacls(acls_supported, rights_supported, getparent):
             for k in keys
         ])
         cur.execute("""
-SELECT _ermrest.model_change_event();
+%(change)s
 UPDATE _ermrest.model_%(restype)s_acl new
 SET members = %(members)s::text[]
 FROM _ermrest.model_%(restype)s_acl old
 WHERE %(where)s
 RETURNING old.members;
 """ % dict(
+    change=model_change_event_sql(self),
     restype=self._model_restype,
     members=sql_literal(list(members)),
     where=where
@@ -707,9 +776,10 @@ INSERT INTO _ermrest.model_%(restype)s_acl (%(columns)s, members) VALUES (%(valu
             for k in keys
         ])
         cur.execute("""
-SELECT _ermrest.model_change_event();
+%(change)s
 DELETE FROM _ermrest.model_%(restype)s_acl WHERE %(where)s;
 """ % dict(
+    change=model_change_event_sql(self),
     restype=self._model_restype,
     where=where
     )
@@ -818,13 +888,13 @@ def hasdynacls(dynacl_types_supported):
         _create_storage_table(orig_class, cur, 'dynacl', {'binding_name': 'text'}, {'binding': 'jsonb'})
 
     @classmethod
-    def introspect_dynacl_helper(orig_class, cur, model):
+    def introspect_dynacl_helper(orig_class, rows, model):
         def helper(resource=None, binding_name=None, binding=None):
             if binding is False:
                 resource.dynacls[binding_name] = False
             else:
                 resource.dynacls[binding_name] = AclBinding(model, resource, binding_name, binding)
-        _introspect_helper(orig_class, cur, model, 'dynacl', {'binding_name': 'text'}, {'binding': 'jsonb'}, helper)
+        _introspect_helper(orig_class, rows, model, 'dynacl', helper)
 
     def _interp_dynacl(self, name):
         interp = {
@@ -853,13 +923,14 @@ def hasdynacls(dynacl_types_supported):
             for k in keys
         ])
         cur.execute("""
-SELECT _ermrest.model_change_event();
+%(change)s
 UPDATE _ermrest.model_%(restype)s_dynacl new
 SET binding = %(binding)s::jsonb
 FROM _ermrest.model_%(restype)s_dynacl old
 WHERE %(where)s
 RETURNING old.binding;
 """ % dict(
+    change=model_change_event_sql(self),
     restype=self._model_restype,
     binding=sql_literal(json.dumps(binding)),
     where=where
@@ -896,9 +967,10 @@ INSERT INTO _ermrest.model_%(restype)s_dynacl (%(columns)s, binding) VALUES (%(v
             for k in keys
         ])
         cur.execute("""
-SELECT _ermrest.model_change_event();
+%(change)s
 DELETE FROM _ermrest.model_%(restype)s_dynacl WHERE %(where)s;
 """ % dict(
+    change=model_change_event_sql(self),
     restype=self._model_restype,
     where=where
     )
@@ -917,24 +989,68 @@ DELETE FROM _ermrest.model_%(restype)s_dynacl WHERE %(where)s;
 
     return helper
 
-def get_dynacl_clauses(src, access_type, prefix, dynacls=None):
-    if dynacls is None:
-        dynacls = src.dynacls
-
-    if src.has_right(access_type) is None:
-        clauses = ['False']
+# placeholders in binding SQL templates, using NUL which cannot occur in Postgres text literals
+_template_prefix = u'\x00p'
+_template_attrs = u'\x00a'
 
-        for binding in dynacls.values():
-            if binding is False:
-                continue
-            if not binding.inscope(access_type):
-                continue
+def _uses_star_column(filters):
+    """Return True if any filter uses the free-text column, whose SQL depends on client rights."""
+    for filt in filters:
+        if isinstance(filt, (predicate.Conjunction, predicate.Disjunction)):
+            if _uses_star_column(filt):
+                return True
+        elif isinstance(filt, predicate.Negation):
+            if _uses_star_column([ filt.predicate ]):
+                return True
+        elif hasattr(filt, 'pred'):
+            if _uses_star_column([ filt.pred ]):
+                return True
+        else:
+            col = getattr(filt, 'left_col', None)
+            if col is not None and col.is_star_column():
+                return True
+    return False
+
+def _compile_dynacl_clause(binding, prefix, attrs_sql):
+    aclpath, col, ctype = binding._compile_projection()
+    aclpath.epath.add_filter(predicate.AclPredicate(binding, col, attrs_sql=attrs_sql))
+    authzpath = ermpath.AttributePath(aclpath.epath, [ (True, None, aclpath.epath) ])
+    sql = authzpath.sql_get(limit=1, distinct_on=False, prefix=prefix, enforce_client=False)
+    cacheable = not any([ _uses_star_column(elem.filters) for elem in aclpath.epath._path ])
+    return sql, cacheable
+
+def get_dynacl_clause(binding, prefix):
+    """Return SQL subquery for binding correlated with outer table alias prefix.
+
+       The subquery is compiled once per binding as a template with
+       placeholders for the alias prefix and client attributes, and
+       the template is reused by later requests.  Bindings belong to
+       one model version, so templates never outlive the model they
+       were compiled from.
+    """
+    template = binding._sql_template
+    if template is None:
+        template, cacheable = _compile_dynacl_clause(binding, _template_prefix, _template_attrs)
+        if not cacheable:
+            return _compile_dynacl_clause(binding, prefix, None)[0]
+        binding._sql_template = template
+    return template.replace(_template_prefix, prefix).replace(_template_attrs, predicate.client_attributes_sql())
 
-            aclpath, col, ctype = binding._compile_projection()
-            aclpath.epath.add_filter(predicate.AclPredicate(binding, col))
-            authzpath = ermpath.AttributePath(aclpath.epath, [ (True, None, aclpath.epath) ])
-            clauses.append(authzpath.sql_get(limit=1, distinct_on=False, prefix=prefix, enforce_client=False))
-    else:
-        clauses = ['True']
+def get_dynacl_clauses(src, access_type, prefix, dynacls=None):
+    with request_phase('acl'):
+        if dynacls is None:
+            dynacls = src.dynacls
+
+        if src.has_right(access_type) is None:
+            clauses = ['False']
+
+            for binding in dynacls.values():
+                if binding is False:
+                    continue
+                if not binding.inscope(access_type):
+                    continue
+                clauses.append(get_dynacl_clause(binding, prefix))
+        else:
+            clauses = ['True']
 
-    return clauses
+        return clauses
@@ -81,11 +81,17 @@ class AclBasePredicate (object):
         ]
         return ' AND '.join(['(%s)' % clause for clause in clauses ])
 
+def client_attributes_sql():
+    """Return SQL text[] array of client attributes for ACL matching."""
+    return 'ARRAY[%s]::text[]' % ','.join([ sql_literal(a['id']) for a in web.ctx.webauthn2_context.attributes ] + [sql_literal('*')])
+
 class AclPredicate (object):
-    def __init__(self, binding, column):
+    def __init__(self, binding, column, attrs_sql=None):
         self.binding = binding
         self.left_col = column
         self.left_elem = None
+        # SQL for client attributes array, None means client_attributes_sql()
+        self.attrs_sql = attrs_sql
 
     def validate(self, epath, allow_star=False, enforce_client=True):
         self.left_elem = epath._path[epath.current_entity_position()]
@@ -93,7 +99,7 @@ class AclPredicate (object):
     def sql_where(self, epath, elem, prefix=''):
         lname = '%st%d.%s' % (prefix, self.left_elem.pos, self.left_col.sql_name())
         if self.binding['projection_type'] == 'acl':
-            attrs = 'ARRAY[%s]::text[]' % ','.join([ sql_literal(a['id']) for a in web.ctx.webauthn2_context.attributes ] + [sql_literal('*')])
+            attrs = self.attrs_sql if self.attrs_sql is not None else client_attributes_sql()
             if self.left_col.type.is_array:
                 return '%s && %s' % (lname, attrs)
             else:
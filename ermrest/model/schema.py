@@ -15,12 +15,14 @@
 #
 
 from .. import exception
-from ..util import sql_identifier, view_exists, udecode
+from ..util import sql_identifier, sql_literal, view_exists, udecode
 from .misc import AltDict, AclDict, keying, commentable, annotatable, hasacls, enforce_63byte_id
 from .table import Table
 
 import json
 import web
+import threading
+from collections import OrderedDict
 
 @annotatable
 @hasacls(
@@ -36,8 +38,16 @@ class Model (object):
     database sense of the term.
     """
     
+    # most distinct client role sets with cached access decisions
+    RIGHTS_CACHE_ROLE_SETS = 256
+
     def __init__(self, version):
         self.version = version
+        # catalog rows retained for incremental introspection, if any
+        self.introspection_rows = None
+        # role set -> access decision cache, most recently used at end
+        self._rights_caches = OrderedDict()
+        self._rights_lock = threading.Lock()
         self.schemas = AltDict(
             lambda k: exception.ConflictModel(u"Schema %s does not exist." % k),
             lambda k, v: enforce_63byte_id(k, "Schema")
@@ -49,6 +59,22 @@ class Model (object):
     def keyed_resource(model=None):
         return model
 
+    def rights_cache(self, roles_key):
+        """Return access decision cache shared by requests with the same client roles.
+
+           Cached models are never modified, so decisions remain valid
+           for the life of the model and a new model version starts
+           with empty caches.
+        """
+        with self._rights_lock:
+            cache = self._rights_caches.pop(roles_key, None)
+            if cache is None:
+                cache = dict()
+                while len(self._rights_caches) >= self.RIGHTS_CACHE_ROLE_SETS:
+                    self._rights_caches.popitem(last=False)
+            self._rights_caches[roles_key] = cache
+            return cache
+
     def verbose(self):
         return json.dumps(self.prejson(), indent=2)
 
@@ -97,8 +123,8 @@ class Model (object):
         self.enforce_right('create')
         cur.execute("""
 CREATE SCHEMA %(schema)s ;
-SELECT _ermrest.model_change_event();
-""" % dict(schema=sql_identifier(sname)))
+SELECT _ermrest.model_change_event(%(snamestr)s::text, NULL::text);
+""" % dict(schema=sql_identifier(sname), snamestr=sql_literal(sname)))
         newschema = Schema(self, sname)
         if not self.has_right('owner'):
             newschema.acls['owner'] = [web.ctx.webauthn2_context.client] # so enforcement won't deny next step...
@@ -113,8 +139,8 @@ SELECT _ermrest.model_change_event();
         self.schemas[sname].delete_acl(cur, None, purging=True)
         cur.execute("""
 DROP SCHEMA %s ;
-SELECT _ermrest.model_change_event();
-""" % sql_identifier(sname))
+SELECT _ermrest.model_change_event(%s::text, NULL::text);
+""" % (sql_identifier(sname), sql_literal(sname)))
         del self.schemas[sname]
 
 @commentable
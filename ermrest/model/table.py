@@ -183,7 +183,7 @@ CREATE TABLE %(sname)s.%(tname)s (
    %(clauses)s
 );
 COMMENT ON TABLE %(sname)s.%(tname)s IS %(comment)s;
-SELECT _ermrest.model_change_event();
+SELECT _ermrest.model_change_event(%(snamestr)s, %(tnamestr)s);
 SELECT _ermrest.data_change_event(%(snamestr)s, %(tnamestr)s);
 """ % dict(sname=sql_identifier(sname),
            tname=sql_identifier(tname),
@@ -248,7 +248,7 @@ SELECT _ermrest.data_change_event(%(snamestr)s, %(tnamestr)s);
         self.pre_delete(conn, cur)
         cur.execute("""
 DROP %(kind)s %(sname)s.%(tname)s ;
-SELECT _ermrest.model_change_event();
+SELECT _ermrest.model_change_event(%(snamestr)s, %(tnamestr)s);
 SELECT _ermrest.data_change_event(%(snamestr)s, %(tnamestr)s);
 """ % dict(
     kind={'r': 'TABLE', 'v': 'VIEW', 'f': 'FOREIGN TABLE'}[self.kind],
@@ -275,7 +275,7 @@ SELECT _ermrest.data_change_event(%(snamestr)s, %(tnamestr)s);
         self.enforce_right('owner')
         cur.execute("""
 ALTER TABLE %(sname)s.%(tname)s  %(alter)s ;
-SELECT _ermrest.model_change_event();
+SELECT _ermrest.model_change_event(%(snamestr)s, %(tnamestr)s);
 SELECT _ermrest.data_change_event(%(snamestr)s, %(tnamestr)s);
 """ % dict(sname=sql_identifier(self.schema.name), 
            tname=sql_identifier(self.name),
@@ -373,7 +373,7 @@ SELECT _ermrest.data_change_event(%(snamestr)s, %(tnamestr)s);
             doc['acl_bindings'] = self.dynacls
         return doc
 
-    def sql_name(self, dynauthz=None, access_type='select', alias=None, dynauthz_testcol=None, dynauthz_testfkr=None):
+    def sql_name(self, dynauthz=None, access_type='select', alias=None, dynauthz_testcol=None, dynauthz_testfkr=None, columns=None):
         """Generate SQL representing this entity for use as a FROM clause.
 
            dynauthz: dynamic authorization mode to compile
@@ -391,6 +391,10 @@ SELECT _ermrest.data_change_event(%(snamestr)s, %(tnamestr)s);
                None: normal mode
                fkr: compile using dynamic ACLs from fkr instead of from this table
 
+           columns:
+               None: project all columns for dynauthz=True
+               set: only project columns with these names for dynauthz=True
+
            The result is a schema-qualified table name for dynauthz=None, else a subquery.
         """
         tsql = '.'.join([
@@ -409,8 +413,13 @@ SELECT _ermrest.data_change_event(%(snamestr)s, %(tnamestr)s);
             clauses = get_dynacl_clauses(self if dynauthz_testfkr is None else dynauthz_testfkr, access_type, alias)
 
             if dynauthz:
+                # a zero-column projection is valid when the caller needs no columns
                 tsql = "(SELECT %s FROM %s %s WHERE (%s))" % (
-                    ', '.join([ c.sql_name_dynauthz(talias, dynauthz=True, access_type=access_type) for c in self.columns_in_order()]),
+                    ', '.join([
+                        c.sql_name_dynauthz(talias, dynauthz=True, access_type=access_type)
+                        for c in self.columns_in_order()
+                        if columns is None or c.name in columns
+                    ]),
                     tsql,
                     talias,
                     ' OR '.join(["(%s)" % clause for clause in clauses ]),
@@ -0,0 +1,375 @@
+
+#
+# Copyright 2026 University of Southern California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""In-process cache of introspected catalog models.
+
+Only the newest model version of each catalog is held in the
+least-recently-used order.  Superseded or evicted models stay
+reachable through weak references for as long as in-flight requests
+still use them, so concurrent requests at the same version keep
+sharing one copy but nothing stays resident after they finish.
+
+Concurrent cache misses for the same catalog version share a single
+introspection rather than each running the same catalog queries.
+
+Catalog rows of introspected models may also be saved as snapshots in
+a local directory, so a new service process can build its first model
+of each catalog without introspecting the whole database.
+
+"""
+
+import os
+import sys
+import threading
+import logging
+import time
+import weakref
+import marshal
+import hashlib
+from collections import OrderedDict
+
+logger = logging.getLogger('ermrest')
+
+# rough resident bytes of each kind of model resource
+_SCHEMA_BYTES = 2048
+_TABLE_BYTES = 4096
+_COLUMN_BYTES = 1536
+_KEY_BYTES = 1024
+
+def model_size(model):
+    """Return approximate resident bytes of model.
+
+       The estimate counts model resources rather than walking every
+       object, and doubles when catalog rows are retained for
+       incremental introspection.
+    """
+    schemas = list(model.schemas.values())
+    if getattr(model, 'ermrest_schema', None) is not None:
+        schemas.append(model.ermrest_schema)
+    size = 0
+    for schema in schemas:
+        size += _SCHEMA_BYTES
+        for table in schema.tables.values():
+            size += _TABLE_BYTES \
+                    + _COLUMN_BYTES * len(table.columns) \
+                    + _KEY_BYTES * (len(table.uniques) + len(table.fkeys))
+    if getattr(model, 'introspection_rows', None) is not None:
+        size *= 2
+    return size
+
+class _Flight (object):
+    """One introspection in progress, awaited by concurrent requests."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.model = None
+        self.error = None
+
+class ModelCache (object):
+    """Bounded LRU map of (catalog, model version) -> Model.
+
+       The defaults may be overridden with configure() using a
+       "model_cache" configuration block.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (catalog, version) -> (model, size), most recently used at end
+        self._entries = OrderedDict()
+        # catalog -> (catalog, version) of its entry
+        self._catalogs = dict()
+        # (catalog, version) -> model no longer held in _entries
+        self._pinned = weakref.WeakValueDictionary()
+        # (catalog, version) -> _Flight in progress
+        self._flights = dict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.flights = 0
+        self.flight_waits = 0
+        self.flight_timeouts = 0
+        self._last_log = time.time()
+        self.configure(dict())
+
+    def configure(self, config):
+        """Apply "model_cache" configuration settings.
+
+           Recognized keys with their defaults:
+
+             "max_entries": 64      models held, at most one per catalog
+             "max_bytes": 0         approximate model bytes held, 0 for no byte limit
+             "stats_interval": 300  seconds between counter log messages, 0 disables
+             "flight_timeout": 60   seconds to wait for another request's introspection
+
+           The most recently used model is always held, even if it
+           alone exceeds max_bytes.
+        """
+        self.max_entries = max(1, int(config.get('max_entries', 64)))
+        self.max_bytes = int(config.get('max_bytes', 0))
+        self.stats_interval = float(config.get('stats_interval', 300))
+        self.flight_timeout = float(config.get('flight_timeout', 60))
+        with self._lock:
+            self._evict()
+
+    def _release(self, key):
+        # caller must hold self._lock
+        model, size = self._entries.pop(key)
+        self._bytes -= size
+        if self._catalogs.get(key[0]) == key:
+            del self._catalogs[key[0]]
+        self._pinned[key] = model
+
+    def _evict(self):
+        # caller must hold self._lock
+        while len(self._entries) > 1 \
+              and (len(self._entries) > self.max_entries
+                   or (self.max_bytes > 0 and self._bytes > self.max_bytes)):
+            self._release(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _log_stats(self):
+        # caller must hold self._lock
+        now = time.time()
+        if self.stats_interval > 0 and (now - self._last_log) >= self.stats_interval:
+            self._last_log = now
+            logger.info('ERMrest model cache stats: %s' % self._stats())
+
+    def get(self, catalog, version):
+        """Return model of catalog at version or None, counting the hit or miss."""
+        key = (catalog, version)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                # re-insert as most recently used
+                self._entries[key] = entry
+                model = entry[0]
+            else:
+                model = self._pinned.get(key)
+            if model is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            self._log_stats()
+            return model
+
+    def latest(self, catalog):
+        """Return newest held or pinned model of catalog or None, without counting a hit."""
+        with self._lock:
+            key = self._catalogs.get(catalog)
+            if key is not None:
+                return self._entries[key][0]
+            models = [ model for key, model in self._pinned.items() if key[0] == catalog ]
+        if models:
+            return max(models, key=lambda model: model.version)
+        return None
+
+    def single_flight(self, catalog, version, thunk, retry_errors=()):
+        """Return model of catalog at version, sharing one thunk() call among concurrent threads.
+
+           The first thread to miss runs thunk(), which must return
+           the model and should put() it.  Others wait up to
+           flight_timeout seconds for that result and then run thunk()
+           themselves.  Exceptions raised by the first thread are
+           raised again in waiting threads, except instances of
+           retry_errors, e.g. errors of its own database connection,
+           after which waiting threads also run thunk() themselves.
+        """
+        key = (catalog, version)
+        with self._lock:
+            # a flight may have finished since the caller's get()
+            entry = self._entries.get(key)
+            model = entry[0] if entry is not None else self._pinned.get(key)
+            if model is not None:
+                return model
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.flights += 1
+            else:
+                self.flight_waits += 1
+
+        if leader:
+            try:
+                flight.model = thunk()
+                return flight.model
+            except:
+                flight.error = sys.exc_info()
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+
+        if not flight.done.wait(self.flight_timeout):
+            with self._lock:
+                self.flight_timeouts += 1
+            logger.warning('ERMrest model introspection wait timed out after %s seconds' % self.flight_timeout)
+            return thunk()
+        if flight.error is not None:
+            if isinstance(flight.error[1], retry_errors):
+                return thunk()
+            raise flight.error[0], flight.error[1], flight.error[2]
+        return flight.model
+
+    def put(self, catalog, model):
+        """Cache model for catalog, superseding older versions and evicting to fit the limits.
+
+           A model older than the one held for its catalog, e.g. from
+           a lagging replica snapshot, is only pinned for sharing.
+        """
+        key = (catalog, model.version)
+        size = model_size(model)
+        with self._lock:
+            current = self._catalogs.get(catalog)
+            if current is not None:
+                if current[1] > model.version:
+                    self._pinned[key] = model
+                    return
+                self._release(current)
+            self._entries[key] = (model, size)
+            self._catalogs[catalog] = key
+            self._bytes += size
+            self._pinned.pop(key, None)
+            self._evict()
+
+    def _stats(self):
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            flights=self.flights,
+            flight_waits=self.flight_waits,
+            flight_timeouts=self.flight_timeouts,
+            entries=len(self._entries),
+            pinned=len(self._pinned),
+            bytes=self._bytes,
+            max_entries=self.max_entries,
+            max_bytes=self.max_bytes,
+        )
+
+    def stats(self):
+        """Return dictionary of cache counters and sizes."""
+        with self._lock:
+            return self._stats()
+
+cache = ModelCache()
+
+class ModelSnapshot (object):
+    """Catalog rows of one model version loaded from a snapshot file.
+
+       It has the version and introspection_rows of the model it was
+       saved from, so it can serve as the base for introspect().
+    """
+    def __init__(self, version, rows):
+        self.version = version
+        self.introspection_rows = rows
+
+class SnapshotStore (object):
+    """Directory of catalog row snapshots keyed by catalog and model version.
+
+       The defaults may be overridden with configure() using a
+       "model_snapshots" configuration block.
+    """
+    # bump when the layout of introspection rows changes
+    FORMAT = 1
+
+    def __init__(self):
+        self.configure(dict())
+
+    def configure(self, config):
+        """Apply "model_snapshots" configuration settings.
+
+           Recognized keys with their defaults:
+
+             "directory": null   directory holding snapshot files, null disables snapshots
+
+           The directory should only be writable by the service
+           account.
+        """
+        self.directory = config.get('directory')
+
+    def enabled(self):
+        return self.directory is not None
+
+    def _prefix(self, catalog):
+        # hash so catalog descriptor fields such as passwords never appear in file names
+        return '%s-' % hashlib.sha256(catalog).hexdigest()
+
+    def _versions(self, catalog):
+        """Return list of (version, file name) of snapshots of catalog."""
+        prefix = self._prefix(catalog)
+        results = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return results
+        for name in names:
+            if name.startswith(prefix) and name.endswith('.model'):
+                try:
+                    results.append((int(name[len(prefix):-len('.model')]), name))
+                except ValueError:
+                    pass
+        return results
+
+    def load(self, catalog):
+        """Return ModelSnapshot of newest saved version of catalog or None."""
+        versions = self._versions(catalog)
+        if not versions:
+            return None
+        version, name = max(versions)
+        try:
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                fmt, saved_version, rows = marshal.load(f)
+        except (IOError, EOFError, ValueError, TypeError), e:
+            logger.warning('ERMrest ignoring unreadable model snapshot %s: %s' % (name, e))
+            return None
+        if fmt != self.FORMAT or saved_version != version:
+            return None
+        return ModelSnapshot(version, rows)
+
+    def save(self, catalog, model):
+        """Save catalog rows of model unless already saved, removing older snapshots of catalog."""
+        if model.introspection_rows is None or model.version is None:
+            return
+        prefix = self._prefix(catalog)
+        path = os.path.join(self.directory, '%s%d.model' % (prefix, model.version))
+        if os.path.exists(path):
+            return
+        tmp = '%s.%d.%d.tmp' % (path, os.getpid(), threading.current_thread().ident)
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory, 0700)
+            data = marshal.dumps((self.FORMAT, model.version, model.introspection_rows))
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            # atomic so concurrent processes never read partial files
+            os.rename(tmp, path)
+        except (IOError, OSError, ValueError), e:
+            logger.warning('ERMrest failed to save model snapshot %s: %s' % (path, e))
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return
+        for version, name in self._versions(catalog):
+            if version < model.version:
+                try:
+                    os.unlink(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+snapshots = SnapshotStore()
@@ -0,0 +1,124 @@
+
+#
+# Copyright 2026 University of Southern California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""In-process cache of data and model GET response bodies.
+
+Response bodies are cached under keys which include the model and data
+versions they were computed from, so entries never need explicit
+invalidation.  Stale entries simply stop being requested and age out
+of the least-recently-used order as new entries consume the byte
+budget.
+
+"""
+
+import threading
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger('ermrest')
+
+class ResponseCache (object):
+    """Byte-bounded LRU map of response key -> response body string.
+
+       The defaults may be overridden with configure() using a
+       "response_cache" configuration block.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._last_log = time.time()
+        self.configure(dict())
+
+    def configure(self, config):
+        """Apply "response_cache" configuration settings.
+
+           Recognized keys with their defaults:
+
+             "max_bytes": 0              total body bytes cached, 0 disables cache
+             "max_entry_bytes": 1048576  largest body cached
+             "stats_interval": 300       seconds between counter log messages, 0 disables
+
+        """
+        self.max_bytes = int(config.get('max_bytes', 0))
+        self.max_entry_bytes = min(int(config.get('max_entry_bytes', 1024 * 1024)), self.max_bytes)
+        self.stats_interval = float(config.get('stats_interval', 300))
+        with self._lock:
+            self._evict()
+
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _evict(self):
+        # caller must hold self._lock
+        while self._bytes > self.max_bytes and self._entries:
+            key, body = self._entries.popitem(last=False)
+            self._bytes -= len(body)
+            self.evictions += 1
+
+    def _log_stats(self):
+        # caller must hold self._lock
+        now = time.time()
+        if self.stats_interval > 0 and (now - self._last_log) >= self.stats_interval:
+            self._last_log = now
+            logger.info('ERMrest response cache stats: %s' % self._stats())
+
+    def get(self, key):
+        """Return cached body for key or None, counting the hit or miss."""
+        with self._lock:
+            body = self._entries.pop(key, None)
+            if body is None:
+                self.misses += 1
+            else:
+                # re-insert as most recently used
+                self._entries[key] = body
+                self.hits += 1
+            self._log_stats()
+            return body
+
+    def put(self, key, body):
+        """Cache body for key, evicting least-recently-used entries to fit the byte budget."""
+        if len(body) > self.max_entry_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = body
+            self._bytes += len(body)
+            self._evict()
+
+    def _stats(self):
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            entries=len(self._entries),
+            bytes=self._bytes,
+            max_bytes=self.max_bytes,
+        )
+
+    def stats(self):
+        """Return dictionary of cache counters and sizes."""
+        with self._lock:
+            return self._stats()
+
+cache = ResponseCache()
@@ -44,8 +44,140 @@ import psycopg2.pool
 import web
 import sys
 import traceback
-import datetime
-import math
+import threading
+import time
+import os
+import re
+import Queue
+import tempfile
+from collections import OrderedDict
+
+class StatementLog (object):
+    """Request correlation and timing of SQL statements.
+
+       The defaults may be overridden with configure() using a
+       "slow_query_log" configuration block.
+    """
+    def __init__(self):
+        self.configure(dict())
+
+    def configure(self, config):
+        """Apply "slow_query_log" configuration settings.
+
+           Recognized keys with their defaults:
+
+             "threshold_ms": null    log statements taking at least this long, null disables
+             "sql_comment": true     prefix statements with request id comment
+             "max_sql_length": 4096  truncate logged statement text
+
+        """
+        threshold = config.get('threshold_ms')
+        self.threshold_ms = float(threshold) if threshold is not None else None
+        self.sql_comment = bool(config.get('sql_comment', True))
+        self.max_sql_length = int(config.get('max_sql_length', 4096))
+
+    def enabled(self):
+        return self.threshold_ms is not None
+
+    def slow_statements(self, records):
+        """Return list of loggable dicts for records at or above threshold."""
+        if not self.enabled() or not records:
+            return []
+        return [
+            OrderedDict([
+                ('ms', round(rec['ms'], 3)),
+                ('rows', rec['rows']),
+                ('sql', rec['sql'][0:self.max_sql_length]),
+            ])
+            for rec in records
+            if rec['ms'] >= self.threshold_ms
+        ]
+
+statements = StatementLog()
+
+def _request_statement_context():
+    """Return (request id, statement records list) for current web request or (None, None)."""
+    try:
+        return web.ctx.ermrest_request_guid, web.ctx.ermrest_sql_statements
+    except AttributeError:
+        # not in a request thread, e.g. parallel export worker
+        return None, None
+
+class cursor (psycopg2.extensions.cursor):
+    """Customized psycopg2 cursor correlating statements with web requests.
+
+       Each statement is prefixed with a comment naming the request
+       id so server-side views such as pg_stat_activity can be
+       related to ERMrest request logs.  When the slow query log is
+       enabled, the statement duration and row count are recorded
+       for the request, including time spent fetching rows from
+       server-side cursors.
+    """
+    _ermrest_record = None
+
+    def execute(self, query, vars=None):
+        reqid, records = _request_statement_context()
+        if reqid is not None and statements.sql_comment:
+            query = '/* ermrest req=%s */ %s' % (reqid, query)
+        if records is None:
+            self._ermrest_record = None
+            return psycopg2.extensions.cursor.execute(self, query, vars)
+        rec = {'sql': query, 'ms': 0.0, 'rows': 0}
+        records.append(rec)
+        self._ermrest_record = rec
+        t0 = time.time()
+        try:
+            return psycopg2.extensions.cursor.execute(self, query, vars)
+        finally:
+            rec['ms'] += (time.time() - t0) * 1000
+            if self.name is None and self.rowcount > 0:
+                rec['rows'] = self.rowcount
+
+    def _account(self, t0, nrows):
+        rec = self._ermrest_record
+        rec['ms'] += (time.time() - t0) * 1000
+        if self.name is not None:
+            rec['rows'] += nrows
+
+    def fetchone(self):
+        if self._ermrest_record is None:
+            return psycopg2.extensions.cursor.fetchone(self)
+        t0 = time.time()
+        row = psycopg2.extensions.cursor.fetchone(self)
+        self._account(t0, 1 if row is not None else 0)
+        return row
+
+    def fetchmany(self, size=None):
+        if size is None:
+            size = self.arraysize
+        if self._ermrest_record is None:
+            return psycopg2.extensions.cursor.fetchmany(self, size)
+        t0 = time.time()
+        rows = psycopg2.extensions.cursor.fetchmany(self, size)
+        self._account(t0, len(rows))
+        return rows
+
+    def fetchall(self):
+        if self._ermrest_record is None:
+            return psycopg2.extensions.cursor.fetchall(self)
+        t0 = time.time()
+        rows = psycopg2.extensions.cursor.fetchall(self)
+        self._account(t0, len(rows))
+        return rows
+
+    def __iter__(self):
+        if self._ermrest_record is None or self.name is None:
+            # client-side results were already timed by execute()
+            return psycopg2.extensions.cursor.__iter__(self)
+        return self._timed_iter()
+
+    def _timed_iter(self):
+        while True:
+            rows = self.fetchmany(self.itersize)
+            if not rows:
+                return
+            for row in rows:
+                yield row
 
 class connection (psycopg2.extensions.connection):
     """Customized psycopg2 connection factory with per-execution() cursor support.
@@ -53,7 +185,52 @@ class connection (psycopg2.extensions.connection):
     """
     def __init__(self, dsn):
         psycopg2.extensions.connection.__init__(self, dsn)
+        self.cursor_factory = cursor
         self._curnumber  = 1
+        # opaque key describing session-level state set by the application
+        self.session_binding = None
+        # avoid session-level state when connecting via transaction-mode pooler
+        self.transaction_pooling = False
+        # transactions are READ ONLY as configured by PooledConnection.set_access()
+        self.read_only = False
+        # non-held cursors opened by execute() in the current transaction
+        self._transaction_cursors = []
+        # held cursors opened by execute() in the current PooledConnection.perform()
+        self._held_cursors = []
+
+    def commit(self):
+        """Commit transaction, forgetting per-transaction cursors."""
+        self._transaction_cursors = []
+        psycopg2.extensions.connection.commit(self)
+
+    def rollback(self):
+        """Rollback transaction, forgetting session_binding which may have been reverted."""
+        self.session_binding = None
+        self._transaction_cursors = []
+        psycopg2.extensions.connection.rollback(self)
+
+    def close_transaction_cursors(self):
+        """Close any open cursors from execute() that are not held."""
+        for cur in self._transaction_cursors:
+            if not cur.closed:
+                try:
+                    cur.close()
+                except psycopg2.Error:
+                    pass
+
+    def close_held_cursors(self):
+        """Close any held cursors from execute() that are still open."""
+        for cur in self._held_cursors:
+            if not cur.closed:
+                try:
+                    cur.close()
+                except psycopg2.Error:
+                    pass
+        self._held_cursors = []
+
+    def needs_transaction(self):
+        """Return True if open cursors from execute() would be destroyed by commit."""
+        return any([ not cur.closed for cur in self._transaction_cursors ])
 
     def execute(self, stmt, vars=None):
         """Name and create a server-side cursor with withhold=True and run statement in it.
@@ -64,90 +241,662 @@ class connection (psycopg2.extensions.connection):
            need not exist in Python memory if you dispose of your old
            rows as you go.
 
+           In transaction_pooling mode, the cursor is not held and
+           must be drained before the transaction is committed, since
+           the next transaction may run on a different server session.
+           Read-only transactions also use a cursor that is not held,
+           so rows stream as the query runs instead of being
+           materialized on the server at commit.  See
+           needs_transaction().
+
            Please remember to close these per-statement cursors to avoid
            wasting resources on the Postgres server session.
         """
         curname = 'cursor%d' % self._curnumber
         self._curnumber += 1
-        cur = self.cursor(curname, withhold=True)
+        withhold = not (self.transaction_pooling or self.read_only)
+        cur = self.cursor(curname, withhold=withhold)
+        if not withhold:
+            self._transaction_cursors.append(cur)
+        else:
+            self._held_cursors.append(cur)
         cur.execute(stmt, vars=vars)
         return cur
 
-def pool(minconn, maxconn, dsn):
-    """Open a thread-safe connection pool with minconn <= N <= maxconn connections to database.
+class pool (object):
+    """Thread-safe pool of minconn <= N <= maxconn connections to one database.
+
+       The connections are from the customized connection factory in
+       this module.  Connections are opened on demand and idle
+       connections in excess of minconn are closed by the manager's
+       reaper thread.  When the pool is exhausted, getconn() waits
+       for a connection to be returned rather than failing
+       immediately.
 
-       The connections are from the customized connection factory in this module.
+       All pools of one PoolManager share its lock and its global
+       connection limit.
     """
-    return psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, dsn=dsn, connection_factory=connection)
+    def __init__(self, minconn, maxconn, dsn, manager=None):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.dsn = dsn
+        self.manager = manager if manager is not None else PoolManager()
+        self.closed = False
+        self.last_used = time.time()
+        # idle connections as [conn, timestamp] with most recently used at end
+        self._idle = []
+        # map id(conn) -> conn for connections handed out by getconn()
+        self._used = dict()
+        # count of open or opening connections, idle or used
+        self._nconn = 0
+
+    def getconn(self, timeout=None):
+        """Get an idle or new connection, waiting up to timeout seconds if necessary.
+
+           Raises psycopg2.pool.PoolError if no connection becomes
+           available in time or too many requests are already
+           waiting.
+        """
+        mgr = self.manager
+        if timeout is None:
+            timeout = mgr.wait_timeout
+        deadline = time.time() + timeout
+        evicted = []
+        try:
+            with mgr._cond:
+                while True:
+                    if self.closed:
+                        raise psycopg2.pool.PoolError("connection pool is closed")
+                    self.last_used = time.time()
+                    if self._idle:
+                        conn = self._idle.pop()[0]
+                        self._used[id(conn)] = conn
+                        return conn
+                    if self._nconn < self.maxconn:
+                        if mgr._total < mgr.max_total:
+                            break
+                        victim = mgr._evict_idle(self)
+                        if victim is not None:
+                            evicted.append(victim)
+                            break
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise psycopg2.pool.PoolError("timed out waiting for a database connection")
+                    if mgr._waiting >= mgr.max_waiting:
+                        raise psycopg2.pool.PoolError("too many requests waiting for a database connection")
+                    mgr._waiting += 1
+                    try:
+                        mgr._cond.wait(remaining)
+                    finally:
+                        mgr._waiting -= 1
+                # reserve a slot and open the connection outside the lock
+                self._nconn += 1
+                mgr._total += 1
+        finally:
+            for conn in evicted:
+                _close_quietly(conn)
+
+        try:
+            conn = psycopg2.connect(self.dsn, connection_factory=connection)
+            conn.transaction_pooling = mgr.transaction_pooling
+        except:
+            with mgr._cond:
+                self._nconn -= 1
+                mgr._total -= 1
+                mgr._cond.notify_all()
+            raise
+
+        with mgr._cond:
+            if self.closed:
+                self._nconn -= 1
+                mgr._total -= 1
+                mgr._cond.notify_all()
+                conn.close()
+                raise psycopg2.pool.PoolError("connection pool is closed")
+            self._used[id(conn)] = conn
+            return conn
+
+    def putconn(self, conn, close=False):
+        """Return a connection to the pool, closing it if close=True or it is unusable."""
+        if not conn.closed and not close:
+            # mirror psycopg2.pool: never keep a connection in an unknown or open transaction
+            try:
+                status = conn.get_transaction_status()
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    close = True
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                close = True
+
+        mgr = self.manager
+        with mgr._cond:
+            if self._used.pop(id(conn), None) is None:
+                raise psycopg2.pool.PoolError("trying to put unkeyed connection")
+            if close or conn.closed or self.closed or self._nconn > self.maxconn:
+                self._nconn -= 1
+                mgr._total -= 1
+                close = True
+            else:
+                self._idle.append([conn, time.time()])
+            mgr._cond.notify_all()
+
+        if close:
+            _close_quietly(conn)
+
+    def closeall(self):
+        """Close the pool, closing idle connections now and used connections when they are returned."""
+        mgr = self.manager
+        with mgr._cond:
+            self.closed = True
+            idle = [ pair[0] for pair in self._idle ]
+            self._idle = []
+            self._nconn -= len(idle)
+            mgr._total -= len(idle)
+            mgr._cond.notify_all()
+        for conn in idle:
+            _close_quietly(conn)
+
+class _EndOfCopy (object):
+    pass
+
+class CopyOutStream (object):
+    """Iterable output file for COPY ... TO STDOUT run in a background thread.
+
+       Output is regrouped into chunks of approximately chunk_size and
+       at most maxchunks chunks are queued, so a slow reader throttles
+       the COPY instead of the output being spooled.
+
+       The stream is registered as an open cursor of the connection
+       so PooledConnection.perform() drains it before commit.  Closing
+       the stream early cancels the COPY on the server.
+    """
+    def __init__(self, chunk_size=64 * 1024, maxchunks=16):
+        self.chunk_size = chunk_size
+        self.queue = Queue.Queue(maxchunks)
+        self.closed = False
+        self.conn = None
+        self._buf = []
+        self._size = 0
+        self._first = None
+        self._thread = None
+        self._error = None
+        self._cancelled = False
+
+    def start(self, cur, sql):
+        """Start COPY sql on cur and wait for its first output or error."""
+        self.conn = cur.connection
+        self.conn._transaction_cursors.append(self)
+
+        def producer():
+            try:
+                cur.copy_expert(sql, self)
+                self._flush()
+            except:
+                self._error = sys.exc_info()
+            self.queue.put(_EndOfCopy)
+
+        self._thread = threading.Thread(target=producer, name='sanepg2-copy-out')
+        self._thread.daemon = True
+        self._thread.start()
+
+        # surface query errors before the caller commits to a response
+        self._first = self.queue.get()
+        if self._first is _EndOfCopy:
+            self._finish()
+
+    def write(self, data):
+        """Accept COPY output from producer thread."""
+        if self._cancelled:
+            return
+        self._buf.append(data)
+        self._size += len(data)
+        if self._size >= self.chunk_size or self._first is None:
+            self._flush()
+
+    def _flush(self):
+        if self._buf and not self._cancelled:
+            chunk = ''.join(self._buf)
+            self._buf = []
+            self._size = 0
+            self.queue.put(chunk)
+
+    def _finish(self):
+        self._thread.join()
+        self.closed = True
+        if self._error is not None:
+            et, ev, tb = self._error
+            self._error = None
+            raise et, ev, tb
+
+    def __iter__(self):
+        item = self._first
+        while item is not _EndOfCopy:
+            yield item
+            item = self.queue.get()
+        if not self.closed:
+            self._finish()
+
+    def close(self):
+        """Cancel COPY if still running and discard remaining output."""
+        if self.closed:
+            return
+        self._cancelled = True
+        try:
+            self.conn.cancel()
+        except:
+            pass
+        item = self._first
+        while item is not _EndOfCopy:
+            item = self.queue.get()
+        self._thread.join()
+        self.closed = True
+
+class _RangeSpool (object):
+    """Output of one export range, readable while it is being written.
+
+       Output beyond max_size is spooled to a temporary file, so a
+       range that finishes far ahead of the reader does not consume
+       memory in proportion to its size.
+    """
+    def __init__(self, max_size, chunk_size=64 * 1024):
+        self.chunk_size = chunk_size
+        self._file = tempfile.SpooledTemporaryFile(max_size)
+        self._cond = threading.Condition()
+        self._written = 0
+        self._read = 0
+        self._done = False
+        self._error = None
+
+    def write(self, data):
+        with self._cond:
+            self._file.seek(self._written)
+            self._file.write(data)
+            self._written += len(data)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            if not self._done:
+                self._done = True
+                self._error = error
+                self._cond.notify_all()
+
+    def __iter__(self):
+        while True:
+            with self._cond:
+                while self._read == self._written and not self._done:
+                    self._cond.wait(1.0)
+                if self._read < self._written:
+                    self._file.seek(self._read)
+                    data = self._file.read(min(self._written - self._read, self.chunk_size))
+                    self._read += len(data)
+                elif self._error is not None:
+                    et, ev, tb = self._error
+                    raise et, ev, tb
+                else:
+                    break
+            yield data
+
+    def close(self):
+        self._file.close()
+
+class ParallelExport (object):
+    """Results of several queries fetched concurrently under one exported snapshot.
+
+       Each query runs on its own transaction importing the snapshot
+       of the requesting transaction, using up to nworkers extra
+       pooled connections.  The serialize(cur, i) function turns the
+       cursor of query i into text chunks, and ranges() yields the
+       chunk iterables in query order so output can be concatenated
+       while later queries are still running.
+
+       Like CopyOutStream, the export is registered as an open cursor
+       of the requesting connection so PooledConnection.perform()
+       keeps the snapshot alive by draining it before commit.
+
+       A positive statement_timeout in milliseconds is applied to
+       each worker transaction, normally the one of the requesting
+       transaction.
+    """
+    def __init__(self, dsn, snapshot, queries, serialize, spool_size=1024 * 1024, statement_timeout=None):
+        if not re.match('^[0-9A-F-]+$', snapshot):
+            raise ValueError('invalid snapshot id %r' % snapshot)
+        self.dsn = dsn
+        self.snapshot = snapshot
+        self.queries = queries
+        self.serialize = serialize
+        self.statement_timeout = statement_timeout
+        self.spools = [ _RangeSpool(spool_size) for q in queries ]
+        self.closed = False
+        self.conn = None
+        self._lock = threading.Lock()
+        self._next = 0
+        self._cancelled = False
+        self._workers = []
+        # worker PooledConnections currently running a query
+        self._active = set()
+        self._threads = []
+
+    def start(self, conn, nworkers):
+        """Start up to nworkers worker connections without waiting for busy pools.
+
+           Raises psycopg2.pool.PoolError if no connection is idle or
+           can be opened immediately.
+        """
+        for i in range(nworkers):
+            try:
+                self._workers.append(PooledConnection(self.dsn, readonly=True, timeout=0))
+            except psycopg2.pool.PoolError:
+                break
+        if not self._workers:
+            raise psycopg2.pool.PoolError("no connections available for parallel export")
+
+        self.conn = conn
+        conn._transaction_cursors.append(self)
+        for pc in self._workers:
+            t = threading.Thread(target=self._work, args=(pc,), name='sanepg2-parallel-export')
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+    def _claim(self, pc):
+        with self._lock:
+            if self._cancelled or self._next >= len(self.queries):
+                return None
+            i = self._next
+            self._next += 1
+            # close() may cancel pc until it is released
+            self._active.add(pc)
+            return i
+
+    def _release(self, pc):
+        with self._lock:
+            self._active.discard(pc)
+
+    def _work(self, pc):
+        i = None
+        try:
+            while True:
+                i = self._claim(pc)
+                if i is None:
+                    break
+                try:
+                    pc.cur.execute("SET TRANSACTION SNAPSHOT '%s' ;" % self.snapshot)
+                    if self.statement_timeout:
+                        pc.cur.execute("SET LOCAL statement_timeout = %d ;" % self.statement_timeout)
+                    cur = pc.conn.execute(self.queries[i])
+                    for chunk in self.serialize(cur, i):
+                        if self._cancelled:
+                            break
+                        self.spools[i].write(chunk)
+                    cur.close()
+                finally:
+                    self._release(pc)
+                pc.conn.commit()
+                self.spools[i].finish()
+            pc.final()
+        except:
+            error = sys.exc_info()
+            with self._lock:
+                # stop other workers and fail any unfinished ranges
+                self._cancelled = True
+            for spool in self.spools:
+                spool.finish(error)
+            if pc.conn is not None:
+                try:
+                    pc.conn.rollback()
+                except:
+                    pass
+                pc.used_pool.putconn(pc.conn, close=True)
+                pc.conn = None
+
+    def ranges(self):
+        """Generate iterable chunks of each query result in query order."""
+        for spool in self.spools:
+            yield spool
+        self._join()
+
+    def _join(self):
+        for t in self._threads:
+            t.join()
+        for spool in self.spools:
+            spool.close()
+        self.closed = True
+
+    def close(self):
+        """Cancel running queries and discard remaining output."""
+        if self.closed:
+            return
+        with self._lock:
+            self._cancelled = True
+            # idle workers may have returned their connections to the pool already
+            for pc in self._active:
+                try:
+                    pc.conn.cancel()
+                except:
+                    pass
+        self._join()
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except:
+        pass
 
 class PoolManager (object):
-    """Manage a set of database connection pools keyed by database name.
+    """Manage a set of database connection pools keyed by database DSN.
 
+       The manager enforces a process-wide limit on open connections
+       across all of its pools, bounds the number of requests waiting
+       for a connection, and runs a background reaper thread to close
+       idle connections and pools.
+
+       The defaults may be overridden with configure() using a
+       "connection_pool" configuration block.
     """
     def __init__(self):
-        # map dsn -> [pool, timestamp]
+        # map dsn -> pool
         self.pools = dict()
-        self.max_idle_seconds = 60 * 5 # 5 minutes
+        self._cond = threading.Condition()
+        self._total = 0
+        self._waiting = 0
+        self._reaper = None
+        self._reaper_pid = None
+        self.configure(dict())
+
+    def configure(self, config):
+        """Apply "connection_pool" configuration settings.
+
+           Recognized keys with their defaults:
+
+             "minconn": 1            idle connections retained per pool
+             "maxconn": 4            connections allowed per pool
+             "max_total": 64         connections allowed across all pools
+             "max_waiting": 64       requests allowed to wait for a connection
+             "wait_timeout": 10      seconds to wait for a connection
+             "idle_timeout": 60      seconds before closing an idle connection
+             "pool_idle_timeout": 300  seconds before closing an unused pool
+             "catalogs": {}          map of catalog id -> {"minconn": ..., "maxconn": ...}
+             "transaction_pooling": false  connect via transaction-mode pooler
+
+           Settings only affect pools created afterward, except for
+           the global limits and timeouts.
+        """
+        self.minconn = int(config.get('minconn', 1))
+        self.maxconn = int(config.get('maxconn', 4))
+        self.max_total = int(config.get('max_total', 64))
+        self.max_waiting = int(config.get('max_waiting', 64))
+        self.wait_timeout = float(config.get('wait_timeout', 10))
+        self.idle_timeout = float(config.get('idle_timeout', 60))
+        self.max_idle_seconds = float(config.get('pool_idle_timeout', 60 * 5))
+        self.transaction_pooling = bool(config.get('transaction_pooling', False))
+        self.catalog_limits = dict(
+            (str(k), v) for k, v in config.get('catalogs', {}).items()
+        )
+
+    def limits(self, key=None):
+        """Return (minconn, maxconn) for pool key, e.g. a catalog id."""
+        limits = self.catalog_limits.get(str(key), {}) if key is not None else {}
+        maxconn = int(limits.get('maxconn', self.maxconn))
+        minconn = min(int(limits.get('minconn', self.minconn)), maxconn)
+        return minconn, maxconn
 
     def __getitem__(self, dsn):
+        """Lookup existing or create new pool for database on demand."""
+        return self.get(dsn)
+
+    def get(self, dsn, key=None):
         """Lookup existing or create new pool for database on demand.
 
-           May fail transiently and caller should retry.
+           The key, e.g. a catalog id, selects per-catalog limits for a new pool.
+        """
+        self._start_reaper()
+        with self._cond:
+            p = self.pools.get(dsn)
+            if p is None:
+                minconn, maxconn = self.limits(key)
+                p = pool(minconn, maxconn, dsn, self)
+                self.pools[dsn] = p
+            p.last_used = time.time()
+            return p
+
+    def _evict_idle(self, requester):
+        """Remove least recently used idle connection of another pool, returning it or None.
 
+           Caller must hold the lock and close the returned connection.
         """
-        # abandon old pools so they can be garbage collected
-        for key in self.pools.keys():
+        victim = None
+        for p in self.pools.values():
+            if p is not requester and p._idle:
+                if victim is None or p._idle[0][1] < victim._idle[0][1]:
+                    victim = p
+        if victim is None:
+            return None
+        conn = victim._idle.pop(0)[0]
+        victim._nconn -= 1
+        self._total -= 1
+        return conn
+
+    def _start_reaper(self):
+        pid = os.getpid()
+        if self._reaper is not None and self._reaper_pid == pid and self._reaper.is_alive():
+            return
+        with self._cond:
+            if self._reaper is not None and self._reaper_pid == pid and self._reaper.is_alive():
+                return
+            self._reaper = threading.Thread(target=self._reap_forever, name='sanepg2-pool-reaper')
+            self._reaper.daemon = True
+            self._reaper_pid = pid
+            self._reaper.start()
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(max(1.0, min(self.idle_timeout, self.max_idle_seconds) / 2.0))
             try:
-                pair = self.pools.pop(key)
-                delta = (datetime.datetime.now() - pair[1])
-                try:
-                    delta_seconds = delta.total_seconds()
-                except:
-                    delta_seconds = delta.seconds + delta.microseconds * math.pow(10,-6)
-                    
-                if delta_seconds < self.max_idle_seconds:
-                    # this pool is sufficiently active so put it back!
-                    boundpair = self.pools.setdefault(key, pair)
-                
-                if self.pools.get(key, [None])[0] != pair[0]:
-                    # our pool is not registered anymore
-                    pair[0].closeall()
-                        
-            except KeyError:
-                # another thread could have purged key before we got to it
-                pass
+                self.reap()
+            except:
+                et, ev, tb = sys.exc_info()
+                web.debug(u'got exception "%s" during sanepg2.PoolManager.reap()' % unicode(ev),
+                          traceback.format_exception(et, ev, tb))
 
-        try:
-            pair = self.pools[dsn]
-            pair[1] = datetime.datetime.now() # update timestamp
-            return pair[0]
-        except KeyError:
-            # atomically get/set pool
-            newpool = pool(1, 4, dsn)
-            boundpair = self.pools.setdefault(dsn, [newpool, datetime.datetime.now()])
-            if boundpair[0] is not newpool:
-                # someone beat us to it
-                newpool.closeall()
-            return boundpair[0]
-            
-
-pools = PoolManager()       
+    def reap(self, now=None):
+        """Close idle connections beyond each pool's minconn and idle pools."""
+        if now is None:
+            now = time.time()
+        victims = []
+        with self._cond:
+            for dsn, p in self.pools.items():
+                if not p._used and (now - p.last_used) >= self.max_idle_seconds:
+                    del self.pools[dsn]
+                    p.closed = True
+                    victims.extend([ pair[0] for pair in p._idle ])
+                    p._nconn -= len(p._idle)
+                    self._total -= len(p._idle)
+                    p._idle = []
+                    continue
+                while len(p._idle) > p.minconn and (now - p._idle[0][1]) >= self.idle_timeout:
+                    victims.append(p._idle.pop(0)[0])
+                    p._nconn -= 1
+                    self._total -= 1
+            if victims:
+                self._cond.notify_all()
+        for conn in victims:
+            _close_quietly(conn)
+
+    def busy(self, dsn):
+        """Return number of connections to dsn currently in use."""
+        with self._cond:
+            p = self.pools.get(dsn)
+            return len(p._used) if p is not None else 0
+
+    def stats(self):
+        """Return a dictionary summarizing pool usage."""
+        with self._cond:
+            return dict(
+                total=self._total,
+                waiting=self._waiting,
+                pools=len(self.pools),
+                idle=sum([ len(p._idle) for p in self.pools.values() ]),
+                used=sum([ len(p._used) for p in self.pools.values() ]),
+            )
+
+pools = PoolManager()
 
 class PooledConnection (object):
-    def __init__(self, dsn):
-        self.used_pool = pools[dsn]
-        self.conn = self.used_pool.getconn()
-        self.conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ)
+    def __init__(self, dsn, key=None, readonly=False, deferrable=False, timeout=None):
+        self.used_pool = pools.get(dsn, key)
+        self.conn = self.used_pool.getconn(timeout)
+        self.set_access(readonly, deferrable)
         self.cur = self.conn.cursor()
 
+    def set_access(self, readonly=False, deferrable=False):
+        """Set access mode for subsequent transactions.
+
+           Transactions are REPEATABLE READ by default.  Read-only
+           transactions skip write bookkeeping and may run on hot
+           standby servers.  Deferrable transactions are SERIALIZABLE
+           READ ONLY DEFERRABLE, which may wait for a snapshot that
+           can then run without any serialization overhead, suitable
+           for long-running exports.
+        """
+        deferrable = readonly and deferrable
+        self.readonly = readonly
+        self.conn.read_only = readonly
+        self.conn.set_session(
+            isolation_level=(
+                psycopg2.extensions.ISOLATION_LEVEL_SERIALIZABLE
+                if deferrable
+                else psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ
+            ),
+            readonly=readonly,
+            deferrable=deferrable
+        )
+
     def perform(self, bodyfunc, finalfunc=lambda x: x, verbose=False):
         """Run bodyfunc(conn, cur) using pooling, commit, transform with finalfunc, clean up.
         
            Automates handling of errors.
+
+           If bodyfunc leaves non-held cursors open, the transformed
+           result is drained before commit instead.  Only read-only
+           work should be done this way since the client may see
+           results before commit.
         """
         assert self.conn is not None
+        self.conn._held_cursors = []
         try:
             result = bodyfunc(self.conn, self.cur)
+            if self.conn.needs_transaction():
+                # must drain non-held cursors before commit
+                result = finalfunc(result)
+                if hasattr(result, 'next'):
+                    for d in result:
+                        yield d
+                else:
+                    yield result
+                self.conn.commit()
+                return
             self.conn.commit()
             result = finalfunc(result)
             if hasattr(result, 'next'):
@@ -156,6 +905,11 @@ class PooledConnection (object):
                     yield d
             else:
                 yield result
+        except psycopg2.extensions.QueryCanceledError, e:
+            # statement timeout or cancel leaves connection usable
+            if self.conn is not None:
+                self.conn.rollback()
+            raise
         except (psycopg2.InterfaceError, psycopg2.OperationalError), e:
             # reset bad connection
             self.used_pool.putconn(self.conn, close=True)
@@ -163,6 +917,12 @@ class PooledConnection (object):
             raise e
         except GeneratorExit, e:
             # happens normally at end of result yielding sequence
+            # or if client disconnects while results are streaming
+            if self.conn is not None:
+                # this cancels background COPY and parallel export queries
+                self.conn.close_transaction_cursors()
+                # release results materialized for a held cursor
+                self.conn.close_held_cursors()
             raise
         except:
             if self.conn is not None:
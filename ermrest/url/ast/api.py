@@ -26,19 +26,24 @@ import re
 
 from ...exception import *
 from ... import sanepg2
-from ...util import sql_literal, negotiated_content_type
+from ...util import sql_literal, negotiated_content_type, request_phase, timed_iter
+from ...model import current_model_version_sql
 import json
 
 
 class Api (object):
 
+    # key of "statement_timeout" config for GET, if any
+    statement_timeout_class = None
+
     def __init__(self, catalog):
         self.catalog = catalog
         self.queryopts = dict()
         self.sort = None
         self.before = None
         self.after = None
-        web.ctx.ermrest_catalog_model = catalog.manager.get_model()
+        if web.ctx.ermrest_catalog_model is None:
+            web.ctx.ermrest_catalog_model = catalog.manager.get_model()
         self.http_vary = web.ctx.webauthn2_manager.get_http_vary()
         self.http_etag = None
 
@@ -86,7 +91,11 @@ class Api (object):
 
         try:
             accept = self.queryopts['accept']
-            accept = {'csv': 'text/csv', 'json': 'application/json' }.get(accept, accept)
+            accept = {
+                'csv': 'text/csv',
+                'json': 'application/json',
+                'arrow': 'application/vnd.apache.arrow.stream',
+            }.get(accept, accept)
             if accept in supported_types:
                 return accept
         except KeyError:
@@ -116,6 +125,39 @@ class Api (object):
             except:
                 return 100
     
+    def negotiated_csv_streaming(self):
+        """Determine whether to stream CSV output instead of spooling it to compute Content-Length."""
+        stream = self.queryopts.get('stream', web.ctx.ermrest_config.get('csv_streaming', False))
+        if str(stream).lower() in ['true', 'false']:
+            return str(stream).lower() == 'true'
+        raise rest.BadRequest('The "stream" query-parameter requires the string "true" or "false".')
+
+    def statement_timeout(self):
+        """Determine statement timeout in milliseconds for this request or None.
+
+           Data GET requests use the timeout configured for their API
+           class and data PUT and POST requests use the "put"
+           timeout.  Anonymous clients use the "anonymous" override
+           for the same key when configured.
+        """
+        if self.statement_timeout_class is None:
+            return None
+        if web.ctx.method == 'GET':
+            key = self.statement_timeout_class
+        elif web.ctx.method in ('PUT', 'POST'):
+            key = 'put'
+        else:
+            return None
+        config = web.ctx.ermrest_config.get('statement_timeout', {})
+        timeout = config.get(key)
+        if web.ctx.webauthn2_context.client is None:
+            timeout = config.get('anonymous', {}).get(key, timeout)
+        try:
+            timeout = int(timeout) if timeout is not None else None
+        except ValueError:
+            return None
+        return timeout if timeout > 0 else None
+
     def set_http_etag(self, version):
         """Set an ETag from version key.
 
@@ -142,6 +184,22 @@ class Api (object):
 
         self.http_etag = '"%s"' % ';'.join(etag).replace('"', '\\"')
 
+    def negotiated_explain(self):
+        """Determine whether to explain data query instead of running it.
+
+           Returns None, 'plan', or 'analyze'.  Only catalog owners may
+           see generated SQL and query plans.
+        """
+        explain = self.queryopts.get('explain')
+        if explain is None:
+            return None
+        explain = str(explain).lower()
+        if explain not in ['plan', 'analyze']:
+            raise rest.BadRequest('The "explain" query-parameter requires the string "plan" or "analyze".')
+        if web.ctx.ermrest_catalog_model.has_right('owner') is not True:
+            raise rest.Forbidden('explain access on %s' % web.ctx.env['REQUEST_URI'])
+        return explain
+
     def parse_client_etags(self, header):
         """Parse header string for ETag-related preconditions.
 
@@ -224,41 +282,112 @@ class Api (object):
         if self.http_etag:
             web.header('ETag', '%s' % self.http_etag)
         
+    def request_preamble(self, pc, min_version=None):
+        """Bind client to database session and return model version in one round trip.
+
+           The webauthn2 session parameters are only set if the pooled
+           connection is not still bound to the same client from an
+           earlier request.  In transaction_pooling mode, they are set
+           transaction-locally for every request instead.
+
+           Returns (version, visible) where visible is False if
+           min_version is given but the transaction snapshot does not
+           yet include that transaction, e.g. on a lagging replica.
+        """
+        client = web.ctx.webauthn2_context.client
+        if type(client) is dict:
+            client_obj = client
+            client = client['id']
+        else:
+            client_obj = { 'id': client }
+
+        attributes = [
+            a['id'] if type(a) is dict else a
+            for a in web.ctx.webauthn2_context.attributes
+        ]
+
+        client_json = json.dumps(client_obj)
+        attributes_json = json.dumps(attributes)
+        binding = (client, client_json, attributes_json)
+
+        # transaction-mode poolers may give us a different server session each transaction
+        is_local = 'true' if pc.conn.transaction_pooling else 'false'
+
+        if pc.conn.session_binding == binding and not pc.conn.transaction_pooling:
+            gucs = []
+        else:
+            gucs = [
+                "set_config('webauthn2.client', %s, %s)" % (sql_literal(client), is_local),
+                "set_config('webauthn2.client_json', %s, %s)" % (sql_literal(client_json), is_local),
+                "set_config('webauthn2.attributes', %s, %s)" % (sql_literal(attributes_json), is_local),
+                "set_config('webauthn2.attributes_array', (ARRAY[%s]::text[])::text, %s)" % (
+                    ','.join([
+                        sql_literal(attr)
+                        for attr in attributes
+                    ]),
+                    is_local
+                ),
+            ]
+
+        if min_version is not None:
+            visible = "txid_visible_in_snapshot(%d, txid_current_snapshot())" % min_version
+        else:
+            visible = "True"
+
+        pc.cur.execute("SELECT %s ;" % ', '.join([ current_model_version_sql(), visible ] + gucs))
+        row = pc.cur.next()
+        pc.conn.session_binding = binding
+        return row[0], row[1]
+
+    def client_etag_version(self):
+        """Return highest version found in client's conditional request ETags or None.
+
+           This is the latest catalog state the client claims to have
+           seen, e.g. from the ETag of a prior response.
+        """
+        versions = []
+        for header in ['HTTP_IF_NONE_MATCH', 'HTTP_IF_MATCH']:
+            for etag in self.parse_client_etags(web.ctx.env.get(header, '')):
+                if etag is True:
+                    continue
+                m = re.match('^"(.*;)?(?P<version>[0-9]+)"$', etag)
+                if m:
+                    versions.append(int(m.group('version')))
+        return max(versions) if versions else None
+
+    def emit_server_timing(self):
+        """Emit Server-Timing header for phases so far, if enabled by configuration."""
+        if web.ctx.ermrest_config.get('server_timing', False):
+            phases = web.ctx.ermrest_request_timer.milliseconds()
+            if phases:
+                web.header('Server-Timing', ', '.join([
+                    '%s;dur=%s' % (name, ms)
+                    for name, ms in phases.items()
+                ]))
+
     def perform(self, body, finish):
+        timeout = self.statement_timeout()
+
         def wrapbody(conn, cur):
             try:
-                client = web.ctx.webauthn2_context.client
-                if type(client) is dict:
-                    client_obj = client
-                    client = client['id']
-                else:
-                    client_obj = { 'id': client }
-
-                attributes = [
-                    a['id'] if type(a) is dict else a
-                    for a in web.ctx.webauthn2_context.attributes
-                ]
-                
-                cur.execute("""
-SELECT set_config('webauthn2.client', %s, false);
-SELECT set_config('webauthn2.client_json', %s, false);
-SELECT set_config('webauthn2.attributes', %s, false);
-SELECT set_config('webauthn2.attributes_array', (ARRAY[%s]::text[])::text, false);
-""" % (
-    sql_literal(client),
-    sql_literal(json.dumps(client_obj)),
-    sql_literal(json.dumps(attributes)),
-    ','.join([
-        sql_literal(attr)
-        for attr in attributes
-    ])
-)
-                )
-                return body(conn, cur)
+                with request_phase('query'):
+                    if timeout is not None:
+                        # also limits each FETCH while results stream before commit
+                        cur.execute("SET LOCAL statement_timeout = %d;" % timeout)
+                    return body(conn, cur)
             except psycopg2.InterfaceError, e:
                 raise rest.ServiceUnavailable("Please try again.")
-            
-        return web.ctx.ermrest_catalog_pc.perform(wrapbody, finish)
+
+        def wrapfinish(result):
+            # headers must be set before serialization starts sending the body
+            self.emit_server_timing()
+            with request_phase('serialize'):
+                output = finish(result)
+            if hasattr(output, 'next'):
+                return timed_iter('serialize', output)
+            return output
+
+        return web.ctx.ermrest_catalog_pc.perform(wrapbody, wrapfinish)
     
     def final(self):
         if self.catalog is not self:
@@ -19,12 +19,16 @@
 """
 
 import json
+import re
 import web
+import psycopg2
 
 import model
 import data
 from .api import Api, negotiated_content_type
 from ... import exception, catalog, sanepg2
+from ...util import request_phase
+from ...model import UpgradeRequired
 from ...apicore import web_method
 from ...exception import *
 
@@ -105,7 +109,8 @@ class Catalog (Api):
     def __init__(self, catalog_id):
         self.catalog_id = catalog_id
         self.manager = None
-        entries = web.ctx.ermrest_registry.lookup(catalog_id)
+        with request_phase('registry'):
+            entries = web.ctx.ermrest_registry.lookup(catalog_id)
         if not entries:
             raise exception.rest.NotFound('catalog ' + str(catalog_id))
         self.manager = catalog.Catalog(
@@ -114,13 +119,72 @@ class Catalog (Api):
             web.ctx.ermrest_config
             )
         
+        config = web.ctx.ermrest_config
+        readonly = web.ctx.method in ('GET', 'HEAD') and config.get('read_only_gets', True)
+
         assert web.ctx.ermrest_catalog_pc is None
-        web.ctx.ermrest_catalog_pc = sanepg2.PooledConnection(self.manager.dsn)
+        if web.ctx.method in ('GET', 'HEAD') and self.manager.replica_dsns:
+            self._bind_replica()
+
+        if web.ctx.ermrest_catalog_pc is None:
+            with request_phase('connect'):
+                pc = sanepg2.PooledConnection(
+                    self.manager.dsn,
+                    self.catalog_id,
+                    readonly=readonly,
+                    deferrable=readonly and config.get('deferrable_exports', False) and self._is_export()
+                )
+            web.ctx.ermrest_catalog_pc = pc
+            try:
+                with request_phase('connect'):
+                    version, visible = self.request_preamble(pc)
+                web.ctx.ermrest_catalog_model = self.manager.get_model(version=version, readonly=readonly)
+            except UpgradeRequired:
+                # retry in read-write mode so introspection can upgrade the catalog
+                pc.conn.rollback()
+                pc.set_access(readonly=False)
+                version, visible = self.request_preamble(pc)
+                web.ctx.ermrest_catalog_model = self.manager.get_model(version=version)
 
         Api.__init__(self, self)
         # now enforce read permission
         self.enforce_right('enumerate', 'catalog/' + str(self.catalog_id))
 
+    def _is_export(self):
+        """Return True if raw query string requests an unlimited result."""
+        return re.search('(^|[&;])limit=none($|[&;])', web.ctx.env.get('QUERY_STRING', ''), re.I) is not None
+
+    def _bind_replica(self):
+        """Try to use a read replica for this request, leaving primary as fallback.
+
+           The replica is only used if it has already replayed the
+           latest version the client has seen and it does not need
+           upgrades that only the primary can apply.
+        """
+        dsn = self.manager.choose_replica(web.ctx.ermrest_config.get('replica_policy'))
+        try:
+            with request_phase('connect'):
+                pc = sanepg2.PooledConnection(dsn, self.catalog_id, readonly=True)
+        except (psycopg2.pool.PoolError, psycopg2.OperationalError), e:
+            web.debug('ERMrest replica unavailable, using primary: %s' % e)
+            return
+
+        replica_model = None
+        try:
+            with request_phase('connect'):
+                version, visible = self.request_preamble(pc, self.client_etag_version())
+            if visible:
+                replica_model = self.manager.get_model(pc.cur, version=version, readonly=True)
+        except (psycopg2.Error, UpgradeRequired), e:
+            web.debug('ERMrest replica failed, using primary: %s' % e)
+        finally:
+            if replica_model is None:
+                pc.final()
+
+        if replica_model is not None:
+            web.ctx.ermrest_catalog_pc = pc
+            web.ctx.ermrest_catalog_model = replica_model
+
     def final(self):
         web.ctx.ermrest_catalog_pc.final()
 
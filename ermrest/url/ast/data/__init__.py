@@ -22,12 +22,15 @@
 import cStringIO
 import web
 import tempfile
+import json
 
 from ..api import Api
 from . import path
 from ....model.predicate import predicatecls
 from ....model.name import Name
-from .... import ermpath, exception
+from .... import ermpath, exception, sanepg2, respcache
+from ....compression import compression
+from ....ermpath import arrow
 from webauthn2.util import urlquote
 
 def _preprocess_attributes(epath, attributes):
@@ -66,48 +69,137 @@ def _preprocess_attributes(epath, attributes):
             
     return results
 
+def _response_cache_key(handler, content_type, version):
+    """Return key for response cache or None if response is not cacheable."""
+    uri = web.ctx.env['REQUEST_URI']
+    if '?' in uri:
+        path, query = uri.split('?', 1)
+        uri = '%s?%s' % (path, '&'.join(sorted(query.split('&'))))
+    return (
+        handler.catalog.catalog_id,
+        uri,
+        content_type,
+        frozenset(web.ctx.ermrest_client_roles),
+        web.ctx.ermrest_catalog_model.version,
+        version,
+    )
+
 def _GET(handler, uri, dresource, vresource):
     """Perform HTTP GET of generic data resources.
+
+       Responses are served from or saved to the response cache
+       when the resource is an entity path free of dynamic ACLs.
     """
-    content_type = handler.negotiated_content_type()
+    supported_types = ['text/csv', 'application/json', 'application/x-json-stream']
+    if arrow.available():
+        supported_types.append(arrow.content_type)
+    content_type = handler.negotiated_content_type(supported_types)
     limit = handler.negotiated_limit()
+    explain = handler.negotiated_explain()
+    cached = dict(key=None, body=None)
 
-    if content_type == 'text/csv':
-        results = tempfile.TemporaryFile()
+    if compression.enabled():
+        # ETag stays the same for every encoding of the same content
+        handler.http_vary.add('accept-encoding')
+    encoding = compression.negotiate(web.ctx.env.get('HTTP_ACCEPT_ENCODING'))
+
+    if explain:
+        # describe query for requested content type in a JSON response
+        response_type = 'application/json'
+        results = None
+    elif content_type == 'text/csv':
+        response_type = content_type
+        if handler.negotiated_csv_streaming():
+            results = sanepg2.CopyOutStream()
+        else:
+            results = tempfile.TemporaryFile()
     else:
+        response_type = content_type
         results = None
         
     def body(conn, cur):
-        handler.set_http_etag( vresource.get_data_version(cur) )
-        handler.http_check_preconditions()
         dresource.add_sort(handler.sort)
         dresource.add_paging(handler.after, handler.before)
+        if explain:
+            # plans are not versioned representations of the data
+            sql, plan = dresource.explain(cur, content_type=content_type, limit=limit, analyze=(explain == 'analyze'))
+            return [ json.dumps({'sql': sql, 'plan': plan}, indent=2) + '\n' ]
+        version = vresource.get_data_version(cur)
+        handler.set_http_etag( version )
+        handler.http_check_preconditions()
+        cached['key'] = None
+        cached['body'] = None
+        if respcache.cache.enabled() \
+           and isinstance(vresource, ermpath.EntityPath) \
+           and vresource.statically_authorized():
+            cached['key'] = _response_cache_key(handler, content_type, version)
+            cached['body'] = respcache.cache.get(cached['key'])
+            web.ctx.ermrest_response_cache = 'hit' if cached['body'] is not None else 'miss'
+            if cached['body'] is not None:
+                return cached['body']
         return dresource.get(conn, cur, content_type=content_type, output_file=results, limit=limit)
 
+    def save_output(lines):
+        # pass lines through, caching them if complete and small enough
+        parts = []
+        size = 0
+        for line in lines:
+            if parts is not None:
+                size += len(line)
+                if size <= respcache.cache.max_entry_bytes:
+                    parts.append(line)
+                else:
+                    parts = None
+            yield line
+        if parts is not None:
+            respcache.cache.put(cached['key'], ''.join(parts))
+
     def post_commit(lines):
         handler.emit_headers()
         if lines is None:
             return
-        web.header('Content-Type', content_type)
+        if cached['body'] is not None:
+            if results is not None and not isinstance(results, sanepg2.CopyOutStream):
+                results.close()
+            lines = [ cached['body'] ]
+            if encoding is None:
+                web.header('Content-Length', '%d' % len(cached['body']))
+        output = output_lines(lines)
+        if cached['key'] is not None and cached['body'] is None:
+            output = save_output(output)
+        if encoding is not None:
+            web.header('Content-Encoding', encoding)
+            output = compression.encode(encoding, output)
+        for buf in output:
+            yield buf
+
+    def output_lines(lines):
+        web.header('Content-Type', response_type)
         if 'download' in handler.queryopts and handler.queryopts['download']:
             fname = handler.queryopts['download']
             fname += {
                 'application/json': '.json',
                 'application/x-json-stream': '.json',
-                'text/csv': '.csv'
-            }.get(content_type, '.txt')
+                'text/csv': '.csv',
+                arrow.content_type: '.arrow',
+            }.get(response_type, '.txt')
             web.header(
                 'Content-Disposition',
                 "attachment; filename*=UTF-8''%s" % urlquote(fname.encode('utf8'))
             )
-        web.ctx.ermrest_content_type = content_type
+        web.ctx.ermrest_content_type = response_type
         
-        if lines is results:
+        if lines is results and isinstance(results, sanepg2.CopyOutStream):
+            # special case for CSV streaming from COPY with chunked transfer
+            for buf in results:
+                yield buf
+        elif lines is results:
             # special case for CSV bouncing through temporary file
             results.seek(0, 2)
             pos = results.tell()
             results.seek(0, 0)
-            web.header('Content-Length', '%d' % pos)
+            if encoding is None:
+                web.header('Content-Length', '%d' % pos)
             
             bufsize = 1024 * 1024
             while True:
@@ -183,6 +275,7 @@ class TextFacet (Api):
     """
 
     default_content_type = 'application/json'
+    statement_timeout_class = 'textfacet'
 
     def __init__(self, catalog, pattern):
         Api.__init__(self, catalog)
@@ -203,6 +296,7 @@ class Entity (Api):
     """A specific entity set by entitypath."""
 
     default_content_type = 'application/json'
+    statement_timeout_class = 'entity'
 
     def __init__(self, catalog, elem):
         Api.__init__(self, catalog)
@@ -266,6 +360,7 @@ class Attribute (Api):
     """A specific attribute set by attributepath."""
 
     default_content_type = 'application/json'
+    statement_timeout_class = 'attribute'
 
     def __init__(self, catalog, elem):
         Api.__init__(self, catalog)
@@ -293,6 +388,7 @@ class AttributeGroup (Api):
     """A specific group set by entity path, group keys, and group attributes."""
 
     default_content_type = 'application/json'
+    statement_timeout_class = 'attributegroup'
 
     def __init__(self, catalog, elem):
         Api.__init__(self, catalog)
@@ -325,6 +421,7 @@ class Aggregate (Api):
     """A specific aggregate tuple."""
 
     default_content_type = 'application/json'
+    statement_timeout_class = 'aggregate'
 
     def __init__(self, catalog, elem):
         Api.__init__(self, catalog)
@@ -24,6 +24,7 @@ import web
 
 from ... import exception
 from ... import model
+from ... import respcache
 from .api import Api
 from ...util import negotiated_content_type
 
@@ -53,13 +54,48 @@ def _post_commit_json(handler, resource):
         return json.dumps(resource, indent=2) + '\n'
     return _post_commit(handler, resource, 'application/json', to_json)
 
-def _GET(handler, thunk, _post_commit):
+def _response_cache_key(handler):
+    """Return response cache key for model document GET."""
+    return (
+        handler.catalog.catalog_id,
+        web.ctx.env['REQUEST_URI'],
+        'application/json',
+        web.ctx.ermrest_client_roles_key,
+        web.ctx.ermrest_catalog_model.version,
+    )
+
+def _GET(handler, thunk, finish):
+    """Perform HTTP GET of model resources.
+
+       Serialized JSON documents are served from or saved to the
+       response cache, since they only depend on the model version
+       and client roles.
+    """
+    cached = dict(key=None, body=None)
+
     def body(conn, cur):
         handler.enforce_right('enumerate')
         handler.set_http_etag( web.ctx.ermrest_catalog_model.version )
         handler.http_check_preconditions()
+        cached['key'] = None
+        cached['body'] = None
+        if finish is _post_commit_json and respcache.cache.enabled():
+            cached['key'] = _response_cache_key(handler)
+            cached['body'] = respcache.cache.get(cached['key'])
+            web.ctx.ermrest_response_cache = 'hit' if cached['body'] is not None else 'miss'
+            if cached['body'] is not None:
+                return None
         return thunk(conn, cur)
-    return handler.perform(body, lambda resource: _post_commit(handler, resource))
+
+    def post_commit(resource):
+        if cached['body'] is not None:
+            return _post_commit(handler, cached['body'], 'application/json')
+        response = finish(handler, resource)
+        if cached['key'] is not None:
+            respcache.cache.put(cached['key'], response)
+        return response
+
+    return handler.perform(body, post_commit)
 
 def _MODIFY(handler, thunk, _post_commit):
     def body(conn, cur):
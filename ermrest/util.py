@@ -25,6 +25,9 @@ import web
 import urllib
 import uuid
 import base64
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from webauthn2.util import urlquote, negotiated_content_type
 
 def urlunquote(url):
@@ -158,3 +161,87 @@ def random_name(prefix=''):
     # TODO: trim out uuid version 4 static bits?  Is 122 random bits overkill?
     return prefix + base64.urlsafe_b64encode(uuid.uuid4().bytes).replace('=','')
 
+_role_sets = dict()
+
+def intern_roles(roles):
+    """Return canonical frozenset equal to roles, shared by requests with the same roles."""
+    key = frozenset(roles)
+    interned = _role_sets.get(key)
+    if interned is None:
+        if len(_role_sets) > 10000:
+            _role_sets.clear()
+        interned = _role_sets.setdefault(key, key)
+    return interned
+
+class PhaseTimer (object):
+    """Accumulate exclusive elapsed time of named request phases.
+
+       Phases may nest, in which case time spent in the inner phase
+       is not charged to the outer phase.
+    """
+    def __init__(self):
+        self.phases = OrderedDict()
+        # stack of [name, resume_time] for active phases
+        self._stack = []
+
+    def _charge(self, now):
+        if self._stack:
+            name, since = self._stack[-1]
+            self.phases[name] = self.phases.get(name, 0.0) + (now - since)
+
+    def start(self, name):
+        now = time.time()
+        self._charge(now)
+        self._stack.append([name, now])
+
+    def stop(self):
+        now = time.time()
+        self._charge(now)
+        self._stack.pop()
+        if self._stack:
+            self._stack[-1][1] = now
+
+    def milliseconds(self):
+        """Return OrderedDict of phase name -> elapsed milliseconds."""
+        return OrderedDict([
+            (name, round(elapsed * 1000, 3))
+            for name, elapsed in self.phases.items()
+        ])
+
+def _request_timer():
+    try:
+        return web.ctx.ermrest_request_timer
+    except AttributeError:
+        # outside of request context, e.g. in a helper thread
+        return None
+
+@contextmanager
+def request_phase(name):
+    """Charge elapsed time of with-block to named phase of current request."""
+    timer = _request_timer()
+    if timer is None:
+        yield
+        return
+    timer.start(name)
+    try:
+        yield
+    finally:
+        timer.stop()
+
+def timed_iter(name, iterable):
+    """Generate items of iterable, charging time to produce them to named phase of current request."""
+    timer = _request_timer()
+    if timer is None:
+        for item in iterable:
+            yield item
+        return
+    it = iter(iterable)
+    while True:
+        timer.start(name)
+        try:
+            item = next(it)
+        except StopIteration:
+            return
+        finally:
+            timer.stop()
+        yield item
@@ -22,6 +22,7 @@ setup(
     version='0.1-prerelease',
     packages=['ermrest', 'ermrest.exception', 'ermrest.url', 'ermrest.url.ast', 'ermrest.url.ast.data'],
     install_requires=['webauthn2', 'web.py', 'psycopg2', 'simplejson', 'python-dateutil'],
+    extras_require={'arrow': ['pyarrow>=0.15,<0.17']},
     maintainer_email='support@misd.isi.edu',
     license='Apache License, Version 2.0',
     classifiers=[
@@ -0,0 +1,114 @@
+#!/usr/bin/python
+
+# Compare full and incremental model introspection on a large catalog.
+#
+# usage: introspect-benchmark.py dsn [tables [columns [repeat]]]
+#
+# The dsn must name an existing ERMrest catalog database.  A synthetic
+# schema is added with the requested number of tables, each with an
+# int8 primary key, some text columns, a foreign key to the previous
+# table, and a table annotation.  After one annotation on one column
+# is changed, introspection is timed reading the whole catalog and
+# reading only the changed table on top of the previous model.  The
+# synthetic schema is dropped again before exit.
+
+import sys
+import time
+import web
+import psycopg2
+from ermrest import sanepg2, model
+from ermrest.util import sql_identifier, sql_literal
+
+SCHEMA = 'introspect_bench'
+
+# tables created or dropped per transaction to stay within the lock table
+BATCH = 500
+
+def tname(i):
+    return 't%05d' % i
+
+def create_tables(conn, cur, tables, columns):
+    cur.execute('CREATE SCHEMA %s ;' % sql_identifier(SCHEMA))
+    for start in range(0, tables, BATCH):
+        for i in range(start, min(start + BATCH, tables)):
+            cols = [ 'id int8 PRIMARY KEY' ] + [ 'c%d text' % c for c in range(columns) ]
+            if i > 0:
+                cols.append('ref int8 REFERENCES %s.%s (id)' % (sql_identifier(SCHEMA), sql_identifier(tname(i - 1))))
+            cur.execute('CREATE TABLE %s.%s (%s) ;' % (sql_identifier(SCHEMA), sql_identifier(tname(i)), ', '.join(cols)))
+        conn.commit()
+    cur.execute("""
+INSERT INTO _ermrest.model_table_annotation (schema_name, table_name, annotation_uri, annotation_value)
+SELECT %(schema)s, 't' || lpad(i::text, 5, '0'), 'tag:misd.isi.edu,2015:display', '{"name": "bench"}'::json
+FROM generate_series(0, %(last)d) s (i) ;
+SELECT _ermrest.model_change_event() ;
+""" % dict(schema=sql_literal(SCHEMA), last=tables - 1))
+    conn.commit()
+
+def drop_tables(conn, cur, tables):
+    for start in reversed(range(0, tables, BATCH)):
+        for i in reversed(range(start, min(start + BATCH, tables))):
+            cur.execute('DROP TABLE IF EXISTS %s.%s ;' % (sql_identifier(SCHEMA), sql_identifier(tname(i))))
+        conn.commit()
+    cur.execute("""
+DROP SCHEMA IF EXISTS %(ident)s ;
+DELETE FROM _ermrest.model_table_annotation WHERE schema_name = %(schema)s ;
+DELETE FROM _ermrest.model_column_annotation WHERE schema_name = %(schema)s ;
+SELECT _ermrest.model_change_event() ;
+""" % dict(ident=sql_identifier(SCHEMA), schema=sql_literal(SCHEMA)))
+    conn.commit()
+
+def timed(thunk, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        result = thunk()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main(argv):
+    if len(argv) < 1:
+        sys.stderr.write("usage: introspect-benchmark.py dsn [tables [columns [repeat]]]\n")
+        return 1
+    dsn = argv[0]
+    tables = int(argv[1]) if len(argv) > 1 else 10000
+    columns = int(argv[2]) if len(argv) > 2 else 10
+    repeat = int(argv[3]) if len(argv) > 3 else 3
+
+    web.ctx.ermrest_config = dict()
+    conn = psycopg2.connect(dsn, connection_factory=sanepg2.connection)
+    cur = conn.cursor()
+    try:
+        start = time.time()
+        create_tables(conn, cur, tables, columns)
+        print 'tables=%d columns=%d created in %.1f s' % (tables, columns, time.time() - start)
+
+        base = model.introspect(cur, retain=True)
+        conn.commit()
+
+        # change one column annotation as the REST API would
+        target = tname(tables / 2)
+        cur.execute("""
+INSERT INTO _ermrest.model_column_annotation (schema_name, table_name, column_name, annotation_uri, annotation_value)
+VALUES (%(schema)s, %(table)s, 'c0', 'tag:misd.isi.edu,2015:display', '{"name": "changed"}'::json) ;
+SELECT _ermrest.model_change_event(%(schema)s, %(table)s) ;
+""" % dict(schema=sql_literal(SCHEMA), table=sql_literal(target)))
+
+        full, full_model = timed(lambda : model.introspect(cur), repeat)
+        incr, incr_model = timed(lambda : model.introspect(cur, base=base), repeat)
+        conn.rollback()
+
+        for m in [ full_model, incr_model ]:
+            doc = m.schemas[SCHEMA].tables[target].columns['c0'].annotations
+            assert doc.get('tag:misd.isi.edu,2015:display') == {"name": "changed"}, doc
+
+        print 'full introspection        %8.1f ms' % (full * 1000)
+        print 'incremental introspection %8.1f ms' % (incr * 1000)
+    finally:
+        conn.rollback()
+        drop_tables(conn, cur, tables)
+        conn.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
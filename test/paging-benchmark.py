@@ -0,0 +1,70 @@
+#!/usr/bin/python
+
+# Compare page N latency of keyset paging predicates on a large indexed table.
+#
+# usage: paging-benchmark.py dsn [rows [pagesize [pages...]]]
+#
+# A temporary table with a composite (a, b) NOT NULL key index is
+# filled with the requested number of rows.  For each page number N,
+# the boundary key of page N-1 is found and the @after(boundary)
+# predicate produced by page_filter_sql() is timed in its legacy
+# form, which assumes all columns may be NULL, and in its row-value
+# form, which is used when the key columns are known to be NOT NULL.
+
+import sys
+import time
+import psycopg2
+from ermrest import sanepg2
+from ermrest.ermpath.resource import page_filter_sql
+from ermrest.model import int8_type
+from ermrest.model.predicate import Value
+
+def timed_page(cur, pred, pagesize, repeat=5):
+    sql = 'SELECT a, b FROM paging_bench WHERE %s ORDER BY a, b LIMIT %d' % (pred, pagesize)
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        cur.execute(sql)
+        cur.fetchall()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(argv):
+    if len(argv) < 1:
+        sys.stderr.write("usage: paging-benchmark.py dsn [rows [pagesize [pages...]]]\n")
+        return 1
+    dsn = argv[0]
+    rows = int(argv[1]) if len(argv) > 1 else 2000000
+    pagesize = int(argv[2]) if len(argv) > 2 else 100
+    pages = [ int(p) for p in argv[3:] ] or [ 1, 10, 100, 1000, 10000 ]
+
+    conn = psycopg2.connect(dsn, connection_factory=sanepg2.connection)
+    cur = conn.cursor()
+    cur.execute("""
+CREATE TEMPORARY TABLE paging_bench AS
+SELECT i / 10 AS a, i %% 10 AS b, md5(i::text) AS payload
+FROM generate_series(0, %d) s (i) ;
+ALTER TABLE paging_bench ALTER COLUMN a SET NOT NULL, ALTER COLUMN b SET NOT NULL ;
+CREATE INDEX ON paging_bench (a, b) ;
+ANALYZE paging_bench ;
+""" % (rows - 1))
+
+    print 'rows=%d pagesize=%d' % (rows, pagesize)
+    for page in pages:
+        offset = (page - 1) * pagesize - 1
+        if offset < 0 or offset >= rows:
+            continue
+        cur.execute('SELECT a, b FROM paging_bench ORDER BY a, b OFFSET %d LIMIT 1' % offset)
+        a, b = cur.fetchone()
+        boundary = [ Value(str(a)), Value(str(b)) ]
+        args = (['a', 'b'], [False, False], [int8_type, int8_type], boundary, False)
+        legacy = timed_page(cur, page_filter_sql(*args), pagesize)
+        rowvalue = timed_page(cur, page_filter_sql(*args, nullables=[False, False]), pagesize)
+        print 'page %-8d legacy %8.2f ms   row-value %8.2f ms' % (page, legacy * 1000, rowvalue * 1000)
+
+    conn.rollback()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
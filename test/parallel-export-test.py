@@ -0,0 +1,99 @@
+#!/usr/bin/python
+
+# Check output framing of parallel exports.
+#
+# usage: parallel-export-test.py [dsn]
+#
+# Range concatenation is checked with synthetic ranges.  If a dsn of
+# a scratch database is given, a table is also exported in key ranges
+# by several worker connections under one shared snapshot, as
+# EntityPath.get() does for large tables, including empty ranges at
+# either end and in the middle.  The table is dropped again before
+# exit.
+
+import sys
+import json
+import web
+import psycopg2
+from ermrest import sanepg2
+from ermrest.ermpath.resource import range_serializer, concat_ranges, row_to_csv
+
+TABLE = 'parallel_export_test'
+
+# key range predicates in output order, some matching no rows
+PREDS = [
+    'id < 0',
+    'id >= 0 AND id < 100',
+    'id >= 100 AND id < 200',
+    'id >= 200 AND id < 300',
+    'id >= 300 AND id < 1000',
+    'id >= 1000',
+]
+
+ROWS = range(1, 100) + range(200, 1000, 7)
+
+def check_concat():
+    ranges = [ [], [ '{"id": 1},\n{"id": 2}' ], [], [ '{"id": 3}' ], [] ]
+    assert json.loads(''.join(concat_ranges('application/json', ranges))) == [ {"id": 1}, {"id": 2}, {"id": 3} ]
+    assert ''.join(concat_ranges('application/json', [ [], [] ])) == '[]\n'
+    assert ''.join(concat_ranges('text/csv', [ [ 'id\n' ], [], [ '1\n', '2\n' ], [ '3\n' ] ])) == 'id\n1\n2\n3\n'
+    assert ''.join(concat_ranges('application/x-json-stream', [ [ '1\n' ], [], [ '2\n' ] ])) == '1\n2\n'
+    print 'range concatenation ok'
+
+def export(dsn, conn, cur, content_type):
+    if content_type == 'text/csv':
+        sql = 'SELECT s.* FROM (SELECT id, name FROM %s) s WHERE %%s ORDER BY s.id' % TABLE
+        cur.execute('%s LIMIT 0 ;' % (sql % 'False'))
+        header = row_to_csv([ d[0] for d in cur.description ]) + '\n'
+    else:
+        sql = 'SELECT row_to_json(s.*)::text FROM (SELECT id, name FROM %s) s WHERE %%s ORDER BY s.id' % TABLE
+        header = None
+    cur.execute('SELECT pg_export_snapshot() ;')
+    snapshot = next(cur)[0]
+    exp = sanepg2.ParallelExport(
+        dsn,
+        snapshot,
+        [ sql % pred for pred in PREDS ],
+        range_serializer(content_type, header),
+        statement_timeout=60000
+    )
+    exp.start(conn, 3)
+    return ''.join(concat_ranges(content_type, exp.ranges()))
+
+def check_export(dsn):
+    conn = psycopg2.connect(dsn, connection_factory=sanepg2.connection)
+    cur = conn.cursor()
+    cur.execute('CREATE TABLE %s (id int8 PRIMARY KEY, name text) ;' % TABLE)
+    cur.execute('INSERT INTO %s (id, name) SELECT i, %s FROM unnest(%%s) s (i) ;' % (TABLE, "'row ' || i"), (ROWS,))
+    conn.commit()
+    try:
+        conn.set_session(isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ, readonly=True)
+        expected = [ dict(id=i, name='row %d' % i) for i in ROWS ]
+
+        lines = export(dsn, conn, cur, 'text/csv').splitlines()
+        assert lines[0] == 'id,name', lines[0]
+        assert lines[1:] == [ '%d,row %d' % (i, i) for i in ROWS ], 'CSV rows out of order'
+        conn.rollback()
+
+        assert json.loads(export(dsn, conn, cur, 'application/json')) == expected, 'JSON array mismatch'
+        conn.rollback()
+
+        lines = export(dsn, conn, cur, 'application/x-json-stream').splitlines()
+        assert [ json.loads(line) for line in lines ] == expected, 'JSON stream mismatch'
+        conn.rollback()
+        print 'parallel export ok'
+    finally:
+        conn.rollback()
+        conn.set_session(readonly=False)
+        cur.execute('DROP TABLE IF EXISTS %s ;' % TABLE)
+        conn.commit()
+        conn.close()
+
+def main(argv):
+    check_concat()
+    if argv:
+        check_export(argv[0])
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,79 @@
+#!/usr/bin/python
+
+# Compare throughput of GET-style transactions in read-write and read-only modes.
+#
+# usage: readonly-get-benchmark.py dsn schema table [threads [seconds [introspect]]]
+#
+# The dsn must name an existing ERMrest catalog database.  Each
+# transaction mimics the database work of a small entity GET: the
+# request preamble, the path data version, and a short result.  With
+# introspect=1, each transaction also introspects the model as on a
+# model cache miss, which includes healing writes in read-write mode.
+
+import sys
+import time
+import threading
+import web
+from ermrest import sanepg2, model
+from ermrest.util import sql_identifier, sql_literal
+
+def get_transaction(conn, cur, sname, tname, introspect, readonly):
+    cur.execute("SELECT %s ;" % model.current_model_version_sql())
+    version = cur.next()[0]
+    if introspect:
+        model.introspect(cur, readonly=readonly)
+    cur.execute("""
+SELECT COALESCE(max(snap_txid), 0) FROM _ermrest.data_version WHERE "schema" = %s AND "table" = %s ;
+""" % (sql_literal(sname), sql_literal(tname)))
+    cur.next()
+    cur.execute("""
+SELECT array_to_json(array_agg(row_to_json(t.*)), True)::text FROM (SELECT * FROM %s.%s LIMIT 10) t ;
+""" % (sql_identifier(sname), sql_identifier(tname)))
+    return cur.next()[0]
+
+def worker(dsn, readonly, sname, tname, introspect, deadline, counts):
+    # introspection reads settings from the thread-local request config
+    web.ctx.ermrest_config = dict()
+    count = 0
+    while time.time() < deadline:
+        pc = sanepg2.PooledConnection(dsn, readonly=readonly)
+        try:
+            pc.perform(lambda conn, cur: get_transaction(conn, cur, sname, tname, introspect, readonly)).next()
+        finally:
+            pc.final()
+        count += 1
+    counts.append(count)
+
+def run(dsn, readonly, sname, tname, threads, seconds, introspect):
+    counts = []
+    deadline = time.time() + seconds
+    workers = [
+        threading.Thread(target=worker, args=(dsn, readonly, sname, tname, introspect, deadline, counts))
+        for i in range(threads)
+    ]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return sum(counts) / float(seconds)
+
+def main(argv):
+    if len(argv) < 3:
+        sys.stderr.write("usage: readonly-get-benchmark.py dsn schema table [threads [seconds [introspect]]]\n")
+        return 1
+    dsn, sname, tname = argv[0:3]
+    threads = int(argv[3]) if len(argv) > 3 else 4
+    seconds = float(argv[4]) if len(argv) > 4 else 10.0
+    introspect = bool(int(argv[5])) if len(argv) > 5 else False
+
+    sanepg2.pools.configure({"maxconn": threads, "max_total": threads})
+
+    for readonly in [False, True]:
+        rate = run(dsn, readonly, sname, tname, threads, seconds, introspect)
+        print '%-10s threads=%d introspect=%s: %.1f transactions/s' % (
+            readonly and 'read-only' or 'read-write', threads, introspect, rate
+        )
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
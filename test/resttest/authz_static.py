@@ -398,6 +398,9 @@ class Authz (common.ErmrestTest):
     def test_wildcard_query(self):
         self.assertHttp(self.session.get('entity/%s:T1/*::regexp::foo' % _S), self.get_data_T1_status)
 
+    def test_explain(self):
+        self.assertHttp(self.session.get('entity/%s:T1?explain=plan' % _S), 200 if self.rights_C.get(u'owner') else 403)
+
     def test_get_data_T1T3_id(self):
         for url in [
                 'attribute/A:=%s:T1/%s:T3/id,name' % (_S, _S2),
@@ -1,5 +1,8 @@
 
 import unittest
+import datetime
+import dateutil.parser
+import dateutil.tz
 import common
 import basics
 from common import urlquote
@@ -56,6 +59,96 @@ class BasicKey (common.ErmrestTest):
         for x in self._badnulls:
             self.assertHttp(self.session.put("entity/%s:%s" % (_S, self.table), json=x), 409)
 
+    def test_data_5_put_output(self):
+        r = self.session.put("entity/%s:%s" % (_S, self.table), json=self._upsert)
+        self.assertHttp(r, 200, 'application/json')
+        self.assertEqual(len(r.json()), len(self._upsert))
+
+    def test_data_6_get_json(self):
+        r = self.session.get("entity/%s:%s" % (_S, self.table))
+        self.assertHttp(r, 200, 'application/json')
+        self.assertIsInstance(r.json(), list)
+        self.assertGreaterEqual(len(r.json()), len(self._initial))
+        r = self.session.get("entity/%s:%s/id=0" % (_S, self.table))
+        self.assertHttp(r, 200, 'application/json')
+        self.assertEqual(r.json(), [])
+
+    def test_data_7_get_refresh(self):
+        url = "entity/%s:%s@sort(id)" % (_S, self.table)
+        r1 = self.session.get(url)
+        self.assertHttp(r1, 200, 'application/json')
+        r2 = self.session.get(url)
+        self.assertHttp(r2, 200, 'application/json')
+        self.assertEqual(r2.headers.get('etag'), r1.headers.get('etag'))
+        self.assertEqual(r2.content, r1.content)
+        self.assertHttp(self.session.put("entity/%s:%s" % (_S, self.table), json=self._initial), 200)
+        r3 = self.session.get(url)
+        self.assertHttp(r3, 200, 'application/json')
+        self.assertNotEqual(r3.headers.get('etag'), r1.headers.get('etag'))
+        for row in self._initial:
+            self.assertIn(row, [ dict([ (k, v) for k, v in got.items() if k in row ]) for got in r3.json() ])
+        self.assertHttp(self.session.put("entity/%s:%s" % (_S, self.table), json=self._upsert), 200)
+
+    def test_csv_stream(self):
+        url = 'entity/%s:%s@sort(id)?accept=csv' % (_S, self.table)
+        spooled = self.session.get(url + '&stream=false')
+        self.assertHttp(spooled, 200, 'text/csv')
+        self.assertIn('content-length', spooled.headers)
+        streamed = self.session.get(url + '&stream=true')
+        self.assertHttp(streamed, 200, 'text/csv')
+        self.assertNotIn('content-length', streamed.headers)
+        self.assertEqual(streamed.content, spooled.content)
+        self.assertHttp(self.session.get(url + '&stream=maybe'), 400)
+
+    def test_explain(self):
+        url = 'entity/%s:%s@sort(id)' % (_S, self.table)
+        for mode in ['plan', 'analyze']:
+            r = self.session.get(url + '?explain=%s' % mode)
+            self.assertHttp(r, 200, 'application/json')
+            self.assertIn('SELECT', r.json()['sql'])
+            self.assertIsInstance(r.json()['plan'], list)
+        self.assertHttp(self.session.get(url + '?explain=maybe'), 400)
+
+    def test_export(self):
+        url = 'entity/%s:%s' % (_S, self.table)
+        for accept in ['json', 'csv']:
+            exported = self.session.get(url + '?limit=none&accept=%s' % accept)
+            self.assertHttp(exported, 200)
+            sorted_ = self.session.get(url + '@sort(id)?limit=none&accept=%s' % accept)
+            self.assertHttp(sorted_, 200)
+            self.assertEqual(sorted(exported.content.splitlines()), sorted(sorted_.content.splitlines()))
+
+    def test_compressed(self):
+        url = 'entity/%s:%s@sort(id)?accept=csv' % (_S, self.table)
+        plain = self.session.get(url, headers={'accept-encoding': 'identity'})
+        self.assertHttp(plain, 200, 'text/csv')
+        self.assertNotIn('content-encoding', plain.headers)
+        for codec in ['gzip', 'zstd']:
+            r = self.session.get(url, headers={'accept-encoding': codec})
+            self.assertHttp(r, 200, 'text/csv')
+            if r.headers.get('content-encoding') != codec:
+                continue
+            # requests transparently decodes gzip but not zstd
+            if codec == 'gzip':
+                self.assertEqual(r.content, plain.content)
+            self.assertIn('accept-encoding', r.headers.get('vary', '').lower())
+            self.assertEqual(r.headers.get('etag'), plain.headers.get('etag'))
+            self.assertHttp(self.session.get(url, headers={'accept-encoding': codec, 'if-none-match': plain.headers.get('etag')}), 304)
+
+    def test_data_8_arrow(self):
+        r = self.session.get('entity/%s:%s@sort(id)?accept=arrow' % (_S, self.table))
+        self.assertHttp(r, 200)
+        if r.headers.get('content-type', '').split(';')[0] != 'application/vnd.apache.arrow.stream':
+            raise unittest.SkipTest('Arrow output not offered by service')
+        try:
+            import pyarrow
+        except ImportError:
+            raise unittest.SkipTest('Arrow output check requires pyarrow')
+        table = pyarrow.ipc.open_stream(r.content).read_all()
+        rows = self.session.get('entity/%s:%s' % (_S, self.table)).json()
+        self.assertEqual(table.num_rows, len(rows))
+        self.assertEqual(set(table.schema.names), set(rows[0].keys()))
+
     def test_download(self):
         r = self.session.get('entity/%s:%s?download=%s' % (_S, self.table, self.table))
         self.assertHttp(r, 200)
@@ -87,6 +180,23 @@ class CompositeKey (BasicKey):
         [ {"last_update": "2010-01-01", "name": "FooN", "site": 1} ],
     ]
 
+    def test_data_9_arrow_timestamptz(self):
+        url = 'entity/%s:%s/id=1&site=1' % (_S, self.table)
+        r = self.session.get(url + '?accept=arrow')
+        self.assertHttp(r, 200)
+        if r.headers.get('content-type', '').split(';')[0] != 'application/vnd.apache.arrow.stream':
+            raise unittest.SkipTest('Arrow output not offered by service')
+        try:
+            import pyarrow
+        except ImportError:
+            raise unittest.SkipTest('Arrow output check requires pyarrow')
+        table = pyarrow.ipc.open_stream(r.content).read_all()
+        got = table.column('last_update').cast(pyarrow.int64()).to_pylist()
+        expected = dateutil.parser.parse(self.session.get(url).json()[0]['last_update'])
+        epoch = datetime.datetime(1970, 1, 1, tzinfo=dateutil.tz.tzutc())
+        delta = expected - epoch
+        self.assertEqual(got, [ (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds ])
+
 class DataLoad (common.ErmrestTest):
     table = _T2b
 
@@ -142,5 +142,28 @@ class MultiKeyReference (common.ErmrestTest):
         # regression test for ermrest#160, internal server error with MultiKeyReference
         self.assertHttp(self.session.get('entity/%(S)s:%(T1)s/%(S)s:%(T2b)s' % {'T1': _T1, 'T2b': _T2b, 'S': _S}), 200)
 
+class SemiJoinEntities (common.ErmrestTest):
+    path = 'entity/%(S)s:%(T2)s/%(S)s:%(T1)s' % {'T1': _T1, 'T2': _T2, 'S': _S}
+
+    def _check_ids(self, suffix, expected):
+        r = self.session.get(self.path + suffix)
+        self.assertHttp(r, 200, 'application/json')
+        self.assertEqual([ row['id'] for row in r.json() ], expected)
+
+    def test_distinct(self):
+        self._check_ids('@sort(id)', [1, 2, 3])
+
+    def test_limit(self):
+        self._check_ids('@sort(id::desc::)?limit=2', [3, 2])
+
+    def test_after(self):
+        self._check_ids('@sort(id)@after(1)', [2, 3])
+
+    def test_before(self):
+        self._check_ids('@sort(id)@before(3)?limit=1', [2])
+
+    def test_filtered(self):
+        self._check_ids('/name=foo', [1])
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)